@@ -9,15 +9,18 @@ defined), and the next package will be processed.
 from __future__ import print_function
 
 import logging
+from multiprocessing.pool import ThreadPool
 import os
 import shutil
 import subprocess
+import threading
+import weakref
 from argparse import Namespace
 import posixpath as urlpath
 
 import binstar_client.utils
 import binstar_client
-from .conda_interface import get_index
+from .conda_interface import get_index, subdir
 from conda_build.metadata import MetaData
 from conda_build.build import bldpkg_path
 
@@ -50,6 +53,14 @@ class ArtefactDestination(object):
         """
         pass
 
+    def flush(self):
+        """
+        Wait until every distribution given to :meth:`make_available` is
+        available on this destination, raising if any of them failed.
+
+        """
+        pass
+
 
 class DirectoryDestination(ArtefactDestination):
     def __init__(self, directory):
@@ -69,14 +80,49 @@ class DirectoryDestination(ArtefactDestination):
 
 
 class AnacondaClientChannelDest(ArtefactDestination):
-    def __init__(self, token, owner, channel):
+    """
+    Make distributions available on a channel of an anaconda.org owner.
+
+    Parameters
+    ----------
+    token : str
+        The anaconda.org token to authenticate with.
+    owner : str
+        The owner (user or organisation) of the channel.
+    channel : str
+        The channel (label) to make the distributions available on.
+    repodata_cache : conda_build_all.repodata.RepodataCache
+        The fetch layer used to list the channel.
+    upload_jobs : int
+        The maximum number of uploads to run concurrently, in the background.
+        Failed uploads are reported by :meth:`flush`. If 0, each upload is
+        complete before :meth:`make_available` returns. Each upload thread
+        has its own client, with which it also makes the package listing
+        requests of the (shared) owner inventory. The destination's own
+        client is only used by the thread calling :meth:`make_available`.
+
+    """
+    # token -> binstar client, so that destinations with the same token share
+    # a client (and so the owner inventories of that client).
+    _clients = weakref.WeakValueDictionary()
+
+    def __init__(self, token, owner, channel, repodata_cache=None, upload_jobs=0):
         self.token = token
         self.owner = owner
         self.channel = channel
+        self.repodata_cache = repodata_cache
+        self.upload_jobs = upload_jobs
         self._cli = None
+        self._inventory = None
+        self._channel_distributions = None
+        self._upload_pool = None
+        # (meta, AsyncResult) of the uploads which haven't been flushed.
+        self._uploads = []
+        # The clients of the upload threads, which don't share a session.
+        self._upload_local = threading.local()
 
     @classmethod
-    def from_spec(cls, spec):
+    def from_spec(cls, spec, **kwargs):
         """
         Create an AnacondaClientChannelDest given the channel specification.
 
@@ -89,17 +135,50 @@ class AnacondaClientChannelDest(ArtefactDestination):
             owner, _, channel = spec.split('/')
         else:
             owner, channel = spec, 'main'
-        return cls(token, owner, channel)
+        return cls(token, owner, channel, **kwargs)
 
-    def make_available(self, meta, built_dist_path, just_built, config=None):
+    @property
+    def channel_distributions(self):
+        """
+        The filenames of the distributions on the target channel. The channel
+        is listed once, and the listing is kept up to date as distributions
+        are made available on it.
+
+        """
+        if self._channel_distributions is None:
+            self._channel_distributions = inspect_binstar.channel_distributions(
+                self.owner, self.channel, repodata_cache=self.repodata_cache)
+        return self._channel_distributions
+
+    @property
+    def inventory(self):
+        """
+        The :class:`~conda_build_all.inspect_binstar.OwnerInventory` of the
+        owner's files, shared by every destination using the same client.
+
+        """
+        if self._inventory is None:
+            self._inventory = inspect_binstar.owner_inventory(self._client(), self.owner)
+        return self._inventory
+
+    def _client(self):
         if self._cli is None:
-            self._cli = binstar_client.utils.get_binstar(Namespace(token=self.token, site=None))
+            cli = self._clients.get(self.token)
+            if cli is None:
+                cli = binstar_client.utils.get_binstar(Namespace(token=self.token, site=None))
+                self._clients[self.token] = cli
+            self._cli = cli
+        return self._cli
 
-        already_with_owner = inspect_binstar.distribution_exists(self._cli, self.owner, meta)
-        already_on_channel = inspect_binstar.distribution_exists_on_channel(self._cli,
-                                                                            self.owner,
-                                                                            meta,
-                                                                            channel=self.channel)
+    def make_available(self, meta, built_dist_path, just_built, config=None):
+        self._client()
+
+        fname = '{}.tar.bz2'.format(meta.dist())
+        already_on_channel = fname in self.channel_distributions
+        # There is no need to ask the server about the owner if the
+        # distribution is already on the channel.
+        already_with_owner = (already_on_channel or
+                              self.inventory.distribution_exists(meta))
         if already_on_channel and not just_built:
             log.info('Nothing to be done for {} - it is already on {}/{}.'.format(meta.name(), self.owner, self.channel))
         elif already_on_channel and just_built:
@@ -112,12 +191,18 @@ class AnacondaClientChannelDest(ArtefactDestination):
             # Link a distribution.
             log.info('Adding existing {} to the {}/{} channel.'.format(meta.dist(), self.owner, self.channel))
             inspect_binstar.add_distribution_to_channel(self._cli, self.owner, meta, channel=self.channel)
+            self.channel_distributions.add(fname)
 
         elif just_built:
             # Upload the distribution
             log.info('Uploading {} to the {} channel.'.format(meta.name(), self.channel))
-            build.upload(self._cli, meta, self.owner, channels=[self.channel],
-                         config=config)
+            if self.upload_jobs > 0:
+                if self._upload_pool is None:
+                    self._upload_pool = ThreadPool(self.upload_jobs)
+                result = self._upload_pool.apply_async(self._background_upload, (meta, fname, config))
+                self._uploads.append((meta, result))
+            else:
+                self._upload(meta, fname, config)
 
         elif not just_built:
             # The distribution already existed, but not under the target owner.
@@ -125,3 +210,55 @@ class AnacondaClientChannelDest(ArtefactDestination):
                 source_owner = urlpath.basename(urlpath.dirname(built_dist_path.rstrip('/')))
                 inspect_binstar.copy_distribution_to_owner(self._cli, source_owner, self.owner, meta,
                                                            channel=self.channel)
+                self.inventory.add_file(meta.name(), meta.version(),
+                                        '{}/{}'.format(subdir, fname))
+                self.channel_distributions.add(fname)
+
+    def _background_upload(self, meta, fname, config):
+        # Run in an upload thread, with that thread's own client.
+        cli = getattr(self._upload_local, 'cli', None)
+        if cli is None:
+            cli = binstar_client.utils.get_binstar(Namespace(token=self.token, site=None))
+            self._upload_local.cli = cli
+        self._upload(meta, fname, config, cli=cli)
+
+    def _upload(self, meta, fname, config, cli=None):
+        build.upload(cli or self._cli, meta, self.owner, channels=[self.channel],
+                     config=config, inventory=self.inventory)
+        self.channel_distributions.add(fname)
+
+    def flush(self):
+        uploads, self._uploads = self._uploads, []
+        failures = []
+        for meta, result in uploads:
+            try:
+                result.get()
+            except Exception as err:
+                log.error('Failed to upload {} to {}/{}: {}'.format(meta.dist(), self.owner,
+                                                                  self.channel, err))
+                failures.append((meta, err))
+        if self._upload_pool is not None:
+            self._upload_pool.close()
+            self._upload_pool.join()
+            self._upload_pool = None
+        if self._inventory is not None:
+            log.info('{}: {} package listing request(s), {} lookup(s) answered without a '
+                     'request.'.format(self.owner, self._inventory.n_requests,
+                                       self._inventory.n_skipped))
+            # The inventory may be shared with other destinations, so whichever
+            # is flushed first reports the decisions.
+            decisions = self._inventory.pop_upload_decisions()
+            if decisions:
+                counts = {}
+                for basename, decision in decisions:
+                    counts[decision] = counts.get(decision, 0) + 1
+                log.info('Uploads to {}: {}.'.format(
+                    self.owner, ', '.join('{} {}'.format(count, decision)
+                                          for decision, count in sorted(counts.items()))))
+                for basename, decision in decisions:
+                    if decision != 'uploaded':
+                        log.info('    {}: {}'.format(basename, decision))
+        if failures:
+            raise RuntimeError('Failed to upload {} distribution(s) to {}/{}:\n{}'.format(
+                len(failures), self.owner, self.channel,
+                '\n'.join('    {}: {}'.format(meta.dist(), err) for meta, err in failures)))
@@ -1,7 +1,6 @@
-# NOTE: This module has no unit tests.
-
 from __future__ import print_function
 
+import hashlib
 import os
 import shutil
 
@@ -16,7 +15,6 @@ except ImportError:
     from conda_build.build import bldpkg_path as get_output_file_path
 
 import conda_build.source
-import binstar_client
 from binstar_client.utils.detect import detect_package_type, get_attrs
 
 from . import inspect_binstar
@@ -42,51 +40,112 @@ def build(meta, test=True):
         return meta
 
 
-def upload(cli, meta, owner, channels=['main'], config=None):
-    """Upload a distribution, given the build metadata."""
+def file_checksums(path, blocksize=1 << 20):
+    """Return the (md5, sha256) hex digests of the given file, read in blocks."""
+    md5, sha256 = hashlib.md5(), hashlib.sha256()
+    with open(path, 'rb') as fh:
+        for block in iter(lambda: fh.read(blocksize), b''):
+            md5.update(block)
+            sha256.update(block)
+    return md5.hexdigest(), sha256.hexdigest()
+
+
+def same_checksums(file_info, md5, sha256):
+    """
+    Whether the checksums recorded in the given binstar file information
+    match those given. Returns None if no checksum is recorded.
+
+    """
+    recorded = [(file_info.get(key), value)
+                for key, value in [('sha256', sha256), ('md5', md5)]
+                if file_info.get(key)]
+    if not recorded:
+        return None
+    return all(remote == local for remote, local in recorded)
+
+
+def upload(cli, meta, owner, channels=['main'], config=None, inventory=None):
+    """
+    Upload a distribution, given the build metadata.
+
+    The owner's existing packages, releases and files are looked up in (and
+    recorded in) the given :class:`~conda_build_all.inspect_binstar.OwnerInventory`.
+    If one isn't given, the inventory shared by everything using the client
+    is used, so each package (and release) is only looked up or created
+    once. The lookups are made with the given client, so the inventory may
+    be shared with other threads.
+
+    If the owner already has a file of the same name, it is only replaced if
+    its checksums differ from those of the distribution (or aren't known);
+    otherwise the existing file is added to the channels. The decision is
+    recorded in the inventory's ``upload_decisions``.
+
+    """
     fname = get_output_file_path(meta)
     package_type = detect_package_type(fname)
     package_attrs, release_attrs, file_attrs = get_attrs(package_type, fname)
     package_name = package_attrs['name']
     version = release_attrs['version']
-
-    # Check the package exists, otherwise create one.
-    try:
-        cli.package(owner, package_name)
-    except binstar_client.NotFound:
-        print('Creating the {} package on {}'.format(package_name, owner))
-        summary = package_attrs['summary']
-        cli.add_package(owner, package_name, summary, package_attrs.get('license'), public=True)
-
-    # Check the release exists, otherwise create one.
-    try:
-        cli.release(owner, package_name, version)
-    except binstar_client.NotFound:
-        # TODO: Add readme.md support for descriptions?
-
-        # The signature for add_release changed in anaconda-client 1.6.3.
-        # First try the old signature, and if that fails, use the new.
-        try:
-            cli.add_release(owner, package_name, version, requirements=[],
-                            announce=None, description='')
-        except TypeError:
-            cli.add_release(owner, package_name, version, requirements=[],
-                            announce=None, release_attrs={'description': ''})
-
-    try:
-        cli.distribution(owner, package_name, version, file_attrs['basename'])
-    except binstar_client.NotFound:
-        # The file doesn't exist.
-        pass
-    else:
-        print('Distribution %s already exists ... removing' % (file_attrs['basename'],))
-        cli.remove_dist(owner, package_name, version, file_attrs['basename'])
+    if inventory is None:
+        inventory = inspect_binstar.owner_inventory(cli, owner)
+
+    # Concurrent uploads of the same package check and create it in turn.
+    with inventory.package_lock(package_name):
+        # Check the package exists, otherwise create one.
+        if not inventory.package_exists(package_name, binstar_cli=cli):
+            print('Creating the {} package on {}'.format(package_name, owner))
+            summary = package_attrs['summary']
+            cli.add_package(owner, package_name, summary, package_attrs.get('license'), public=True)
+            inventory.add_package(package_name)
+
+        # Check the release exists, otherwise create one.
+        if not inventory.release_exists(package_name, version, binstar_cli=cli):
+            # TODO: Add readme.md support for descriptions?
+
+            # The signature for add_release changed in anaconda-client 1.6.3.
+            # First try the old signature, and if that fails, use the new.
+            try:
+                cli.add_release(owner, package_name, version, requirements=[],
+                                announce=None, description='')
+            except TypeError:
+                cli.add_release(owner, package_name, version, requirements=[],
+                                announce=None, release_attrs={'description': ''})
+            inventory.add_release(package_name, version)
+
+    basename = file_attrs['basename']
+    md5, sha256 = file_checksums(fname)
+    existing = inventory.file_info(package_name, basename, binstar_cli=cli)
+    decision = 'uploaded'
+    if existing is not None:
+        same = same_checksums(existing, md5, sha256)
+        if same:
+            print('Distribution %s already exists with the same checksums ... '
+                  'not uploading' % (basename,))
+            for channel in channels:
+                if channel not in existing.get('labels', ()):
+                    # Only newer versions of anaconda-client can add a
+                    # single file to a channel.
+                    try:
+                        cli.add_channel(channel, owner, package_name, version,
+                                        filename=basename)
+                    except TypeError:
+                        cli.add_channel(channel, owner, package_name, version)
+            inventory.record_upload(basename, 'identical')
+            return existing
+        decision = 'replaced' if same is False else 'replaced (no remote checksum)'
+        print('Distribution %s already exists ... removing (%s)' % (basename, decision))
+        cli.remove_dist(owner, package_name, version, basename)
+        inventory.remove_file(package_name, basename)
 
     with open(fname, 'rb') as fd:
-        print('\nUploading file %s/%s/%s/%s to %s...' % (owner, package_name, version, file_attrs['basename'], channels))
-        upload_info = cli.upload(owner, package_name, version, file_attrs['basename'],
+        print('\nUploading file %s/%s/%s/%s to %s...' % (owner, package_name, version, basename, channels))
+        upload_info = cli.upload(owner, package_name, version, basename,
                                  fd, package_type, description='',
                                  dependencies=file_attrs.get('dependencies'),
                                  attrs=file_attrs['attrs'],
                                  channels=channels)
-        return upload_info
+    info = dict(upload_info) if isinstance(upload_info, dict) else {}
+    info.update(md5=md5, sha256=sha256, labels=list(channels))
+    inventory.add_file(package_name, version, basename, info)
+    inventory.record_upload(basename, decision)
+    return upload_info
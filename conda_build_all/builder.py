@@ -8,19 +8,27 @@ defined), and the next package will be processed.
 """
 from __future__ import print_function
 
+from collections import defaultdict, deque
 from copy import deepcopy
-import glob
 import logging
+import multiprocessing
 try:
     from unittest import mock
 except ImportError:
     import mock
 import os
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+import shutil
+import tempfile
+import time
+import traceback
 
 from binstar_client.utils import get_binstar
-import binstar_client
-from .conda_interface import (Resolve, get_index, subdir, copy_index,
-                              string_types)
+from .conda_interface import (copy_index, channel_urls, string_types,
+                              OverlayIndex, IncrementalResolve)
 
 try:
     import conda_build.api
@@ -33,9 +41,17 @@ except ImportError:
 
 from . import order_deps
 from . import build
+from .delivery import DeliveryStage
 from . import inspect_binstar
+from . import inspect_directory
+from .index_session import IndexSession
 from . import version_matrix as vn_matrix
 from . import resolved_distribution
+from .render_cache import RenderCache
+from .repodata import RepodataCache
+
+
+log = logging.getLogger(__name__)
 
 
 def package_built_name(package, root_dir):
@@ -47,22 +63,35 @@ def package_built_name(package, root_dir):
         return bldpkg_path(meta)
 
 
-def distribution_exists(binstar_cli, owner, metadata):
-    fname = '{}/{}.tar.bz2'.format(subdir, metadata.dist())
-    try:
-        r = binstar_cli.distribution(owner, metadata.name(), metadata.version(),
-                                     fname)
-        exists = True
-    except binstar_client.errors.NotFound:
-        exists = False
-    return exists
+def _render_recipe(recipe_dir, config=None):
+    """Return the build metadata of the recipe(s) in the given directory."""
+    if hasattr(conda_build, 'api'):
+        pkgs = conda_build.api.render(recipe_dir, config=config,
+                                finalize=False, bypass_env_check=True)
+        # cb2 returns a tuple, with the metadata object as the first
+        #    element.  That's all we care about.
+        if hasattr(pkgs[0], 'config'):
+            pkgs = [pkgs[0]]
+        # cb3 returns a list of tuples, each with the metadata object
+        #    as the first element.  Collect them up.
+        else:
+            pkgs = [pkg[0] for pkg in pkgs]
+        return pkgs
+    else:
+        return [MetaData(recipe_dir)]
+
+
+def _render_recipe_star(args):
+    # Pool.map only passes a single argument to the worker function.
+    return _render_recipe(*args)
 
 
-def list_metas(directory, max_depth=0, config=None):
+def list_metas(directory, max_depth=0, config=None, jobs=1, cache=None):
     """
     Get the build metadata of all recipes in a directory.
 
-    The order of metas from this function is not guaranteed.
+    The order of metas from this function is not guaranteed, though it
+    is the same for a given directory tree irrespective of ``jobs``.
 
     Parameters
     ----------
@@ -73,37 +102,70 @@ def list_metas(directory, max_depth=0, config=None):
         A value ``<=0`` will recurse indefinitely. A value of 1
         will look in the given directory for a meta.yaml.
         (default: 0)
+    config
+        The conda-build configuration to render the recipes with.
+    jobs : int
+        The number of worker processes with which to render the recipes.
+        A value ``<=1`` renders the recipes in this process. (default: 1)
+    cache : conda_build_all.render_cache.RenderCache
+        A cache of previously rendered recipes. Recipes found in the cache
+        are not rendered again, and newly rendered recipes are added to it.
 
     """
-    packages = []
-    current_depth = max_depth
+    recipe_dirs = []
     root = os.path.normpath(directory)
     for new_root, dirs, files in os.walk(root, followlinks=True):
         depth = new_root[len(root):].count(os.path.sep) + 1
         if max_depth > 0 and depth >= max_depth:
             del dirs[:]
+        # Walk the tree in a consistent order, whatever the filesystem.
+        dirs.sort()
 
         if 'meta.yaml' in files:
-            if hasattr(conda_build, 'api'):
-                pkgs = conda_build.api.render(new_root, config=config,
-                                        finalize=False, bypass_env_check=True)
-                # cb2 returns a tuple, with the metadata object as the first
-                #    element.  That's all we care about.
-                if hasattr(pkgs[0], 'config'):
-                    pkgs = [pkgs[0]]
-                # cb3 returns a list of tuples, each with the metadata object
-                #    as the first element.  Collect them up.
-                else:
-                    pkgs = [pkg[0] for pkg in pkgs]
-                packages.extend(pkgs)
-            else:
-                packages.append(MetaData(new_root))
+            recipe_dirs.append(new_root)
 
+    rendered = [None] * len(recipe_dirs)
+    if cache is not None:
+        keys = [cache.key(recipe_dir, config) for recipe_dir in recipe_dirs]
+        rendered = [cache.get(key, config=config) for key in keys]
+    to_render = [recipe_dir for recipe_dir, pkgs in zip(recipe_dirs, rendered)
+                 if pkgs is None]
+
+    if jobs > 1 and len(to_render) > 1:
+        pool = multiprocessing.Pool(min(jobs, len(to_render)))
+        try:
+            # Pool.map preserves the order of its input, so the result is
+            # deterministic regardless of which worker rendered which recipe.
+            new_pkgs = pool.map(_render_recipe_star,
+                                [(recipe_dir, config) for recipe_dir in to_render])
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        new_pkgs = [_render_recipe(recipe_dir, config)
+                    for recipe_dir in to_render]
+
+    new_pkgs = iter(new_pkgs)
+    for i, pkgs in enumerate(rendered):
+        if pkgs is None:
+            rendered[i] = pkgs = next(new_pkgs)
+            if cache is not None:
+                cache.put(keys[i], pkgs)
+    if cache is not None:
+        cache.evict()
+
+    packages = []
+    for pkgs in rendered:
+        packages.extend(pkgs)
     return packages
 
 
-def sort_dependency_order(metas, config):
-    """Sort the metas into the order that they must be built."""
+def named_dependencies(metas, config):
+    """
+    Return a dictionary mapping each meta's name to the names of the other
+    metas that it depends on (at build or run time).
+
+    """
     meta_named_deps = {}
     buildable = [meta.name() for meta in metas]
     for meta in metas:
@@ -139,8 +201,236 @@ def sort_dependency_order(metas, config):
         # Remove version information from the name.
         all_deps = [dep.split(' ', 1)[0] for dep in all_deps]
         meta_named_deps[meta.name()] = [dep for dep in all_deps if dep in buildable]
-    sorted_names = list(order_deps.resolve_dependencies(meta_named_deps))
-    return sorted(metas, key=lambda meta: sorted_names.index(meta.name()))
+    return meta_named_deps
+
+
+def sort_dependency_order(metas, config, named_deps=None):
+    """
+    Sort the metas into the order that they must be built.
+
+    If ``named_deps`` is not given, it is computed with
+    :func:`named_dependencies`.
+
+    """
+    if named_deps is None:
+        named_deps = named_dependencies(metas, config)
+    rank = {name: position for position, name in
+            enumerate(order_deps.resolve_dependencies(named_deps))}
+    return sorted(metas, key=lambda meta: rank[meta.name()])
+
+
+def _isolated_build(position, meta, config):
+    """
+    Build the given distribution in its own conda-build root, and move the
+    resulting artefacts into the conda-build root of the given config.
+
+    Run in a worker process by :meth:`Builder.build_concurrently`, hence the
+    errors (including SystemExit, which conda-build raises for some
+    failures) are returned as a formatted traceback rather than raised.
+
+    """
+    shared_croot = config.croot
+    work_croot = tempfile.mkdtemp(prefix='conda_build_all_')
+    try:
+        # Artefacts built by upstream recipes are in the shared conda-build
+        # root, so make it available as a channel for this build.
+        shared_channel = 'file://' + shared_croot.replace(os.path.sep, '/')
+        build_configs = [config]
+        if getattr(meta.resolved_meta, 'config', config) is not config:
+            build_configs.append(meta.resolved_meta.config)
+        for build_config in build_configs:
+            build_config.croot = work_croot
+            build_config.channel_urls = (tuple(build_config.channel_urls) +
+                                         (shared_channel, ))
+        output_paths = []
+        for path in Builder.build(meta, config):
+            subdir_dir = os.path.join(shared_croot,
+                                      os.path.basename(os.path.dirname(path)))
+            if not os.path.isdir(subdir_dir):
+                os.makedirs(subdir_dir)
+            shutil.copy2(path, subdir_dir)
+            output_paths.append(os.path.join(subdir_dir, os.path.basename(path)))
+        return position, output_paths, None
+    except BaseException:
+        return position, None, traceback.format_exc()
+    finally:
+        shutil.rmtree(work_croot, ignore_errors=True)
+
+
+def _build_worker(results, position, meta, config):
+    # The target of the build processes of Builder.build_concurrently.
+    results.put(_isolated_build(position, meta, config))
+
+
+def _next_build_result(results, running, poll_interval=1):
+    """
+    Return the next ``(position, output_paths, error)`` put on the results
+    queue by the given running build processes (a dict of position to
+    process). A process which exits without a result (e.g. it was killed)
+    gives an error result. A None put on the queue (e.g. to signal that a
+    delivery has finished) is returned as it is.
+
+    """
+    while True:
+        try:
+            return results.get(timeout=poll_interval)
+        except queue.Empty:
+            pass
+        for position, process in running.items():
+            if process.exitcode is not None:
+                # The process may have put its result just before exiting.
+                try:
+                    return results.get(timeout=poll_interval)
+                except queue.Empty:
+                    return position, None, ('The build process exited with code {} '
+                                            'without a result.'.format(process.exitcode))
+
+
+def _log_failure(func):
+    """
+    Call the given function, logging (rather than raising) any failure.
+
+    This is for cleaning up while another error is being raised, which
+    would otherwise be replaced by the failure.
+
+    """
+    try:
+        func()
+    except Exception:
+        log.exception('An error occurred while handling a failed build')
+
+
+class ExistingArtefacts(object):
+    """
+    The artefacts which already exist in the inspection locations, by
+    filename.
+
+    Parameters
+    ----------
+    locations : dict
+        A mapping of artefact filename to the location (channel or
+        directory) in which it exists.
+
+    """
+    def __init__(self, locations=None):
+        self.locations = dict(locations or {})
+        # An artefact in either of the formats (.tar.bz2 or .conda) will do.
+        self._dist_locations = {}
+        for fname, location in self.locations.items():
+            self._dist_locations.setdefault(inspect_directory.dist_name(fname), location)
+        # The (name, version, build number) of each artefact, such that we
+        # can cheaply tell whether a recipe may have existing artefacts.
+        self.prefixes = set(filter(None, (self._prefix(fname)
+                                          for fname in self.locations)))
+
+    def __repr__(self):
+        return '<ExistingArtefacts: {} artefacts>'.format(len(self.locations))
+
+    def __len__(self):
+        return len(self.locations)
+
+    @staticmethod
+    def _prefix(fname):
+        # e.g. numpy-1.10.4-py27_0.tar.bz2 -> ('numpy', '1.10.4', '0').
+        parts = os.path.basename(fname).rsplit('-', 2)
+        if len(parts) != 3:
+            return None
+        name, version, build = parts
+        build = build.split('.', 1)[0]
+        return name, version, build.rsplit('_', 1)[-1]
+
+    def location(self, fname):
+        """Return the location of the given artefact, or None if it doesn't exist."""
+        location = self.locations.get(fname)
+        if location is None:
+            location = self._dist_locations.get(inspect_directory.dist_name(fname))
+        return location
+
+    def may_exist(self, meta):
+        """
+        Return whether any artefact exists for the name, version and build
+        number of the given (un-resolved) recipe.
+
+        """
+        # Recipes without a build number give "", but their artefacts have 0.
+        return (meta.name(), meta.version(), str(meta.build_number() or 0)) in self.prefixes
+
+
+def resolve_distros(meta, resolver, matrix_conditions, solve_cache=None,
+                    existing=None, max_n_major_minor_versions=(2, 2)):
+    """
+    Return the ResolvedDistributions to be considered for the given recipe,
+    and whether they were determined without solving.
+
+    If the ``existing`` artefacts are given, and there is an artefact for
+    every candidate case which survives the pruning of the build matrix, the
+    build matrix isn't solved. The existence of an artefact is taken to mean
+    that its case is solvable, and this is only done when the pruned cases
+    don't depend on the solvability of any of the other candidates (see
+    :func:`conda_build_all.version_matrix.pruning_is_determined`). The
+    pruned result is therefore the same as if the matrix had been solved.
+
+    """
+    if existing is not None and existing.may_exist(meta):
+        distros = resolved_distribution.ResolvedDistribution.resolve_all(
+            meta, resolver.index, matrix_conditions, resolver=resolver,
+            assume_solvable=True)
+        candidates = [distro.special_versions for distro in distros]
+        version_table = vn_matrix.VersionTable.for_index(resolver.index)
+        pruned = vn_matrix.prune_cases(candidates, max_n_major_minor_versions,
+                                       version_table)
+        if (vn_matrix.pruning_is_determined(candidates, max_n_major_minor_versions,
+                                            version_table) and
+                all(existing.location(distro.pkg_fn()) is not None
+                    for distro in distros if distro.special_versions in pruned)):
+            return distros, True
+    distros = resolved_distribution.ResolvedDistribution.resolve_all(
+        meta, resolver.index, matrix_conditions, solve_cache=solve_cache,
+        resolver=resolver)
+    return distros, False
+
+
+# The state which the matrix resolution workers inherit (by forking) from
+# Builder.compute_build_distros, such that the index isn't pickled per task.
+_matrix_state = {}
+
+
+def _fork_context():
+    """
+    Return the multiprocessing context to use for workers which inherit
+    their state by forking, or None if forking isn't possible.
+
+    """
+    if not hasattr(os, 'fork'):
+        return None
+    try:
+        return multiprocessing.get_context('fork')
+    except AttributeError:
+        # Python 2 always forks.
+        return multiprocessing
+
+
+def _resolve_matrix(position):
+    """
+    Return the special version cases to build for the recipe at the given
+    position, resolved against the inherited ``_matrix_state``. Run in a
+    worker process by :meth:`Builder.compute_build_distros`.
+
+    """
+    solve_cache = _matrix_state['solve_cache']
+    before = [getattr(solve_cache, name) for name in solve_cache.counters]
+    distros, prechecked = resolve_distros(
+        _matrix_state['recipes'][position], _matrix_state['resolver'],
+        _matrix_state['conditions'], solve_cache=solve_cache,
+        existing=_matrix_state['existing'],
+        max_n_major_minor_versions=_matrix_state['max_n_versions'])
+    # The increments of the solve cache's counters.
+    counts = {name: getattr(solve_cache, name) - value
+              for name, value in zip(solve_cache.counters, before)}
+    # The worker's use of the cache is recorded before it exits.
+    solve_cache.flush()
+    return (position, [distro.special_versions for distro in distros],
+            prechecked, counts)
 
 
 class Builder(object):
@@ -148,7 +438,9 @@ class Builder(object):
                  inspection_channels, inspection_directories,
                  artefact_destinations,
                  matrix_conditions, matrix_max_n_major_minor_versions=(2, 2),
-                 dry_run=False):
+                 dry_run=False, render_jobs=1, render_cache=False, jobs=1,
+                 solve_cache=True, matrix_jobs=1, existence_precheck=True,
+                 delivery_queue=0):
         """
         Build a directory of conda recipes sequentially, if they don't already exist in the inspection locations.
 
@@ -171,97 +463,319 @@ class Builder(object):
         dry_run : bool
             True to stop before building recipes but after determining which
             recipes to build.
+        render_jobs : int
+            The number of worker processes to use when rendering the recipes.
+        render_cache : bool
+            Whether to re-use the rendered metadata of unchanged recipes from
+            previous runs (cached in the conda-build root directory). Only
+            the content of the recipe directory (and its location) is taken
+            into account, hence this is off by default.
+        jobs : int
+            The number of distributions to build concurrently. Each
+            distribution is built once all of the distributions it depends
+            on have been built.
+        solve_cache : bool
+            Whether to re-use the results of solves from previous runs (cached
+            in the conda-build root directory) when computing the build matrix.
+        matrix_jobs : int
+            The number of worker processes to use when computing the build
+            matrix. The result is the same irrespective of the number of jobs.
+        existence_precheck : bool
+            Whether to skip solving the build matrix of recipes for which
+            artefacts of all of the candidate cases already exist in the
+            inspection locations.
+        delivery_queue : int
+            The maximum number of distributions waiting to be delivered to
+            the artefact destinations in the background, whilst the builds
+            continue. A build only waits for the delivery of the in-repo
+            distributions it depends on. If 0, each distribution is delivered
+            before the next build starts.
 
         """
         self.conda_recipes_directory = conda_recipes_directory
         self.inspection_channels = inspection_channels or []
         self.inspection_directories = inspection_directories
         self.artefact_destinations = artefact_destinations
-        self.matrix_conditions = matrix_conditions
+        # Compiled once, and shared by all of the recipes.
+        self.matrix_conditions = vn_matrix.MatrixConditions(matrix_conditions or [])
         self.matrix_max_n_major_minor_versions = matrix_max_n_major_minor_versions
         self.dry_run = dry_run
+        self.render_jobs = render_jobs
+        self.render_cache = render_cache
+        self.jobs = jobs
+        self.solve_cache = solve_cache
+        self.matrix_jobs = matrix_jobs
+        self.existence_precheck = existence_precheck
+        self.delivery_queue = delivery_queue
+        self.directory_index = inspect_directory.DirectoryIndex()
+        self.repodata_cache = RepodataCache()
+        self.recipe_dependencies = {}
 
-    def fetch_all_metas(self, config):
+    def fetch_all_metas(self, config, jobs=None):
         """
         Return the conda recipe metas, in the order they should be built.
 
+        If ``jobs`` is not given, the Builder's ``render_jobs`` will be used.
+
         """
+        if jobs is None:
+            jobs = self.render_jobs
         conda_recipes_directory = os.path.abspath(os.path.expanduser(self.conda_recipes_directory))
-        recipe_metas = list_metas(conda_recipes_directory, config=config)
-        recipe_metas = sort_dependency_order(recipe_metas, config=config)
+        cache = None
+        if self.render_cache:
+            cache = RenderCache.from_config(config)
+        recipe_metas = list_metas(conda_recipes_directory, config=config,
+                                  jobs=jobs, cache=cache)
+        if cache is not None:
+            print('Render cache: {} hits, {} misses'.format(cache.hits,
+                                                            cache.misses))
+        self.recipe_dependencies = named_dependencies(recipe_metas, config)
+        recipe_metas = sort_dependency_order(recipe_metas, config=config,
+                                             named_deps=self.recipe_dependencies)
         return recipe_metas
 
-    def find_existing_built_dists(self, recipe_metas):
-        recipes = tuple([meta, None] for meta in recipe_metas)
+    def find_existing_artefacts(self, config=None, session=None):
+        """
+        Return the :class:`ExistingArtefacts` in the inspection channels and
+        directories. An artefact in a channel takes precedence over one in a
+        directory, and the earlier directories over the later ones.
+
+        If a config is given, the repodata of the inspection channels and the
+        listings of the inspection directories are cached in its conda-build
+        root between runs. The channel data is taken from the given
+        :class:`~conda_build_all.index_session.IndexSession`, if any.
+
+        """
+        locations = {}
         if self.inspection_channels:
-            # For an unknown reason we are unable to cache the get_index call. There is a
-            # test which fails against v3.18.6 if use_cache is True.
-            index = get_index(self.inspection_channels, prepend=False, use_cache=False)
             # We look to see if a distribution exists in the channel. Note: This is not checking
             # there is a distribution for this platform. This isn't a big deal, as channels are
             # typically split by platform. If this changes, we would need to re-consider how this
             # is implemented.
-
-            # We temporarily workaround the index containing the channel information in the key.
-            # We should deal with this properly though.
-            index = {meta['fn']: meta for meta in index.values()}
-
-            for recipe_pair in recipes:
-                meta, dist_location = recipe_pair
-                if meta.pkg_fn() in index:
-                    recipe_pair[1] = index[meta.pkg_fn()]['channel']
+            if session is None:
+                if config is not None:
+                    session = IndexSession(config)
+                else:
+                    session = IndexSession(repodata_cache=self.repodata_cache)
+            # The channels are fetched concurrently, and merged in priority order.
+            for snapshot in session.snapshots(channel_urls(self.inspection_channels)):
+                for fname in snapshot.fnames:
+                    # The highest priority channel takes precedence.
+                    locations.setdefault(fname, snapshot.url)
         if self.inspection_directories:
+            if config is not None:
+                directory_index = inspect_directory.DirectoryIndex.from_config(config)
+            else:
+                directory_index = self.directory_index
             for directory in self.inspection_directories:
-                files = glob.glob(os.path.join(directory, '*.tar.bz2'))
-                fnames = [os.path.basename(fpath) for fpath in files]
-                for recipe_pair in recipes:
-                    meta, dist_location = recipe_pair
-                    if dist_location is None and meta.pkg_fn() in fnames:
-                        recipe_pair[1] = directory
-        return recipes
-
-    def build(self, meta, config):
+                for fname in directory_index.artefacts(directory):
+                    locations.setdefault(fname, directory)
+        return ExistingArtefacts(locations)
+
+    def find_existing_built_dists(self, recipe_metas, existing=None):
+        """
+        Return a ``[meta, location]`` pair for each of the given metas, where
+        the location is that of the existing artefact or None.
+
+        If the ``existing`` artefacts are not given, they are found with
+        :meth:`find_existing_artefacts`.
+
+        """
+        if existing is None:
+            existing = self.find_existing_artefacts()
+        return tuple([meta, existing.location(meta.pkg_fn())]
+                     for meta in recipe_metas)
+
+    @staticmethod
+    def build(meta, config):
         print('Building ', meta.dist())
         config = meta.vn_context(config=config)
         try:
-            output_paths = conda_build.api.build(meta.meta, config=config)
+            output_paths = conda_build.api.build(meta.resolved_meta, config=config)
         except AttributeError:
             with meta.vn_context():
-                output_paths = bldpkg_path(build.build(meta.meta))
+                output_paths = bldpkg_path(build.build(meta.resolved_meta))
         if isinstance(output_paths, string_types):
             output_paths = [output_paths]
         return output_paths
 
-    def compute_build_distros(self, index, recipes, config):
+    def compute_build_distros(self, index, recipes, config, jobs=None,
+                              existing=None, resolver=None):
         """
         Given the recipes which are to be built, return a list of BakedDistribution instances
         for all distributions that should be built.
 
+        If ``jobs`` is not given, the Builder's ``matrix_jobs`` will be used.
+
+        If the ``existing`` artefacts (an :class:`ExistingArtefacts`) are
+        given, the build matrix of recipes whose artefacts all already exist
+        isn't solved (see :func:`resolve_distros`).
+
+        If a resolver (an :class:`~conda_build_all.conda_interface.IncrementalResolve`
+        of an overlay of the index) is given, it is used in place of a new
+        one, and the planned distributions are added to it.
+
         """
+        if jobs is None:
+            jobs = self.matrix_jobs
         all_distros = []
-        index = copy_index(index)
-
-        for meta in recipes:
-            distros = resolved_distribution.ResolvedDistribution.resolve_all(meta, index,
-                                                                             self.matrix_conditions)
-            cases = [distro.special_versions for distro in distros]
-            cases = list(vn_matrix.keep_top_n_major_versions(cases, n=self.matrix_max_n_major_minor_versions[0]))
-            cases = list(vn_matrix.keep_top_n_minor_versions(cases, n=self.matrix_max_n_major_minor_versions[1]))
+        # The distributions we plan to build are added to an overlay of the
+        # index, so that they can be considered by the recipes that follow.
+        # A single resolver is shared by all of the recipes, and absorbs the
+        # planned distributions as they are added.
+        if resolver is None:
+            resolver = IncrementalResolve(OverlayIndex(copy_index(index)))
+        index = resolver.index
+        if self.solve_cache:
+            solve_cache = vn_matrix.PersistentSolveCache.from_config(config)
+        else:
+            solve_cache = vn_matrix.SolveCache()
+
+        # The number of recipes whose distributions all already existed.
+        n_prechecked = [0]
+
+        def resolve(meta):
+            distros, prechecked = resolve_distros(meta, resolver,
+                                                  self.matrix_conditions,
+                                                  solve_cache=solve_cache,
+                                                  existing=existing,
+                                                  max_n_major_minor_versions=self.matrix_max_n_major_minor_versions)
+            n_prechecked[0] += prechecked
+            return distros
+
+        def plan(distros):
+            # Add the distributions which survive the pruning to the plan,
+            # returning the names of the records added to the index.
+            cases = vn_matrix.prune_cases([distro.special_versions for distro in distros],
+                                          self.matrix_max_n_major_minor_versions,
+                                          vn_matrix.VersionTable.for_index(index))
+            added = set()
             for distro in distros:
                 if distro.special_versions in cases:
                     # Update the index with this distribution so that it can be considered by the version matrix.
                     if distro.pkg_fn() not in index:
-                        index[distro.pkg_fn()] = distro.info_index()
+                        resolver.add(distro.pkg_fn(), distro.info_index())
+                        added.add(distro.name())
                     all_distros.append(distro)
+            return added
 
+        context = _fork_context()
+        try:
+            if jobs <= 1 or context is None or len(recipes) <= 1:
+                for meta in recipes:
+                    plan(resolve(meta))
+            else:
+                n_prechecked[0] += self._resolve_in_waves(
+                    recipes, resolve, plan, resolver, solve_cache, context, jobs,
+                    existing=existing)
+        finally:
+            solve_cache.close()
+
+        if n_prechecked[0]:
+            print('Skipped solving the build matrix of {} recipe(s) whose '
+                  'distributions already exist'.format(n_prechecked[0]))
+
+        print('Solver cache: {} hits, {} misses'.format(solve_cache.hits,
+                                                        solve_cache.misses))
+        if solve_cache.n_candidates:
+            print('Python/numpy candidates: {}, {} after removing '
+                  'duplicates'.format(solve_cache.n_candidates,
+                                      solve_cache.n_unique_candidates))
         return all_distros
 
+    def _resolve_in_waves(self, recipes, resolve, plan, resolver, solve_cache,
+                          context, jobs, existing=None):
+        """
+        Resolve the build matrix of the (dependency ordered) recipes in
+        worker processes, planning the results in exactly the same way as
+        resolving them one after another would.
+
+        Each wave resolves all of the remaining recipes whose in-repo
+        dependencies have been planned. The workers are forked, and hence
+        see the index as it was at the start of the wave. The results are
+        planned in the recipe order; a recipe is resolved again if a record
+        which was planned after the start of its wave (and which therefore
+        wasn't seen by its worker) is in the requirement closure of the
+        recipe.
+
+        Returns the number of recipes which the workers determined (without
+        solving) to have existing artefacts.
+
+        """
+        positions_by_name = defaultdict(list)
+        for position, meta in enumerate(recipes):
+            positions_by_name[meta.name()].append(position)
+        # The position of the last recipe which each recipe depends on.
+        upstream = []
+        for own_position, meta in enumerate(recipes):
+            deps = self.recipe_dependencies.get(meta.name(), ())
+            upstream.append(max([position for dep in deps
+                                 for position in positions_by_name.get(dep, ())
+                                 if position < own_position] or [-1]))
+
+        # position -> (the number of recipes planned when the recipe was
+        # resolved, cases, whether its artefacts all existed).
+        results = {}
+        # The names of the records added to the index by each planned recipe.
+        added_names = []
+        n_resolved_again = 0
+        n_prechecked = 0
+        while True:
+            # Plan the contiguous run of resolved recipes.
+            while len(added_names) in results:
+                position = len(added_names)
+                meta = recipes[position]
+                resolved_with, cases, prechecked = results.pop(position)
+                unseen = set().union(*added_names[resolved_with:])
+                if unseen and unseen & resolver.closure(vn_matrix.matrix_requirement_names(meta)):
+                    n_resolved_again += 1
+                    distros = resolve(meta)
+                else:
+                    n_prechecked += prechecked
+                    distros = [resolved_distribution.ResolvedDistribution(meta, case)
+                               for case in cases]
+                added_names.append(plan(distros))
+
+            n_planned = len(added_names)
+            if n_planned == len(recipes):
+                break
+            # The next recipe's dependencies have all been planned, so the
+            # wave always includes it.
+            wave = [position for position in range(n_planned, len(recipes))
+                    if position not in results and upstream[position] < n_planned]
+            if wave == [n_planned]:
+                # Nothing to be gained from a worker process.
+                added_names.append(plan(resolve(recipes[n_planned])))
+                continue
+
+            print('Resolving the build matrix of {} recipes'.format(len(wave)))
+            _matrix_state.update(recipes=recipes, resolver=resolver,
+                                 solve_cache=solve_cache,
+                                 conditions=self.matrix_conditions,
+                                 existing=existing,
+                                 max_n_versions=self.matrix_max_n_major_minor_versions)
+            pool = context.Pool(min(jobs, len(wave)))
+            try:
+                for position, cases, prechecked, counts in pool.imap_unordered(_resolve_matrix, wave):
+                    results[position] = (n_planned, cases, prechecked)
+                    for name, count in counts.items():
+                        setattr(solve_cache, name, getattr(solve_cache, name) + count)
+            finally:
+                pool.terminate()
+                _matrix_state.clear()
+        if n_resolved_again:
+            print('Resolved the build matrix of {} recipe(s) again, to account '
+                  'for planned distributions'.format(n_resolved_again))
+        return n_prechecked
+
     def main(self):
-        index = get_index(use_cache=False)
         if hasattr(conda_build, 'api'):
             build_config = conda_build.api.Config()
         else:
             build_config = conda_build.config.config
+        # The channel data is fetched (and parsed) once, for all of the phases.
+        session = IndexSession(build_config)
+        index = session.index
 
         # If it is not already defined with environment variables, we set the CONDA_NPY
         # to the latest possible value. Since we compute a build matrix anyway, this is
@@ -269,19 +783,23 @@ class Builder(object):
         # ``numpy x.x``), and to ensure that recipes that don't care which version they want
         # at build/test time get a sensible version.
         if build_config.CONDA_NPY is None:
-            resolver = Resolve(index)
-            npy = resolver.get_pkgs('numpy', emptyok=True)
-            if npy:
-                version = ''.join(max(npy).version.split('.')[:2])
+            npy = session.latest_package('numpy')
+            if npy is not None:
+                version = ''.join(npy.version.split('.')[:2])
                 build_config.CONDA_NPY = version
 
         recipe_metas = self.fetch_all_metas(build_config)
         print('Resolving distributions from {} recipes... '.format(len(recipe_metas)))
 
-        all_distros = self.compute_build_distros(index, recipe_metas, build_config)
+        existing = self.find_existing_artefacts(config=build_config, session=session)
+        all_distros = self.compute_build_distros(
+            index, recipe_metas, build_config,
+            existing=existing if self.existence_precheck else None,
+            resolver=session.resolver)
         print('Computed that there are {} distributions from the {} '
               'recipes:'.format(len(all_distros), len(recipe_metas)))
-        recipes_and_dist_locn = self.find_existing_built_dists(all_distros)
+        recipes_and_dist_locn = self.find_existing_built_dists(all_distros,
+                                                               existing=existing)
 
         print('Resolved dependencies, will be built in the following order: \n\t{}'.format(
               '\n\t'.join(['{} (will be built: {})'.format(meta.dist(), dist_locn is None)
@@ -291,12 +809,209 @@ class Builder(object):
             print('Dry run: no distributions built')
             return
 
-        for meta, built_dist_location in recipes_and_dist_locn:
-            was_built = built_dist_location is None
-            if was_built:
-                built_dist_location = self.build(meta, build_config)
-            self.post_build(meta, built_dist_location, was_built,
-                            config=build_config)
+        try:
+            if self.jobs > 1 and hasattr(conda_build, 'api'):
+                self.build_concurrently(recipes_and_dist_locn, build_config)
+            else:
+                self.build_serially(recipes_and_dist_locn, build_config)
+        except BaseException:
+            # Even if a build failed, the distributions which were built are
+            # made available (without hiding the build error).
+            _log_failure(self.flush_artefact_destinations)
+            raise
+        self.flush_artefact_destinations()
+
+    def _delivery_stage(self, config, on_delivered=None):
+        def deliver(meta, built_dist_location, was_built):
+            self.post_build(meta, built_dist_location, was_built, config=config)
+        return DeliveryStage(deliver, self.delivery_queue,
+                             on_delivered=on_delivered)
+
+    def _failed_dependencies(self, name, stage, skipped):
+        # The in-repo dependencies of the named package which failed to be
+        # delivered, or which weren't built because of such a failure.
+        return [dep for dep in self.recipe_dependencies.get(name, ())
+                if dep in skipped or stage.failed(dep)]
+
+    @staticmethod
+    def _report_stage_times(build_time, stage, wall_time):
+        print('Build stage: {:.1f}s, delivery stage: {:.1f}s (of which {:.1f}s '
+              'overlapped with the builds), {:.1f}s waiting for deliveries, '
+              '{:.1f}s in total'.format(
+                  build_time, stage.delivery_time,
+                  max(0, build_time + stage.delivery_time - wall_time),
+                  stage.wait_time, wall_time))
+
+    def build_serially(self, recipes_and_dist_locn, config):
+        """
+        Build the distributions which need building, one after another, and
+        run the post-build phase for all of them.
+
+        If ``self.delivery_queue`` is non-zero, the post-build phase runs in
+        the background; a build waits only for the delivery of the in-repo
+        distributions it depends on (according to
+        ``self.recipe_dependencies``). A distribution which depends on a
+        failed delivery isn't built.
+
+        """
+        start = time.time()
+        build_time = 0.0
+        stage = self._delivery_stage(config)
+        # The names of the packages which weren't built.
+        skipped = set()
+        try:
+            for meta, built_dist_location in recipes_and_dist_locn:
+                was_built = built_dist_location is None
+                if was_built:
+                    stage.wait_for(self.recipe_dependencies.get(meta.name(), ()))
+                    failed = self._failed_dependencies(meta.name(), stage, skipped)
+                    if failed:
+                        print('Not building {}, as {} failed to be delivered'.format(
+                              meta.dist(), ', '.join(failed)))
+                        skipped.add(meta.name())
+                        continue
+                    build_start = time.time()
+                    built_dist_location = self.build(meta, config)
+                    build_time += time.time() - build_start
+                stage.put(meta, built_dist_location, was_built)
+        except BaseException:
+            _log_failure(stage.close)
+            raise
+        stage.close()
+        self._report_stage_times(build_time, stage, time.time() - start)
+
+    def build_concurrently(self, recipes_and_dist_locn, config):
+        """
+        Build the distributions which need building with up to ``self.jobs``
+        processes at once, and run the post-build phase for all of them.
+
+        A distribution is scheduled as soon as all of the distributions it
+        depends on (according to ``self.recipe_dependencies``) have been
+        built (and, if ``self.delivery_queue`` is non-zero, delivered in the
+        background). A distribution which depends on a failed delivery isn't
+        built. Each build has its own conda-build root, so that
+        conda-build's locking and work directory don't serialise them; the
+        artefacts are then moved into the conda-build root of the given
+        config, which is made available as a channel to the builds that
+        follow.
+
+        """
+        start = time.time()
+        build_time = 0.0
+        results = multiprocessing.Queue()
+        # A finished delivery may make a build ready, so it wakes the
+        # scheduler (with a None result).
+        stage = self._delivery_stage(config, on_delivered=lambda: results.put(None))
+        names = [meta.name() for meta, _ in recipes_and_dist_locn]
+        to_build = set(position for position, (_, built_dist_location)
+                       in enumerate(recipes_and_dist_locn)
+                       if built_dist_location is None)
+        # The number of unfinished builds for each package name.
+        unfinished = {}
+        for position in to_build:
+            unfinished[names[position]] = unfinished.get(names[position], 0) + 1
+        # The existing distributions which are yet to be given to the
+        # delivery stage. They are given to it as it has room, so that they
+        # don't hold up the builds.
+        undelivered = deque(position for position in range(len(names))
+                            if position not in to_build)
+        n_undelivered = {}
+        for position in undelivered:
+            n_undelivered[names[position]] = n_undelivered.get(names[position], 0) + 1
+        # The names of the packages which weren't built.
+        skipped = set()
+
+        def ready(position):
+            deps = self.recipe_dependencies.get(names[position], [])
+            return not any(unfinished.get(dep) or n_undelivered.get(dep) or
+                           stage.pending(dep) for dep in deps)
+
+        def deliver_existing(block):
+            # Give the next existing distribution to the delivery stage,
+            # returning whether it was taken.
+            meta, built_dist_location = recipes_and_dist_locn[undelivered[0]]
+            if not stage.put(meta, built_dist_location, False, block=block):
+                return False
+            n_undelivered[names[undelivered.popleft()]] -= 1
+            return True
+
+        # position -> the process building it.
+        running = {}
+        try:
+            waiting = sorted(to_build)
+            while waiting or running:
+                # The waiting builds are in dependency order, so the
+                # dependents of a skipped build are skipped too.
+                for position in list(waiting):
+                    failed = self._failed_dependencies(names[position], stage, skipped)
+                    if failed:
+                        print('Not building {}, as {} failed to be delivered'.format(
+                              recipes_and_dist_locn[position][0].dist(),
+                              ', '.join(failed)))
+                        waiting.remove(position)
+                        skipped.add(names[position])
+                        unfinished[names[position]] -= 1
+                for position in [position for position in waiting if ready(position)]:
+                    if len(running) >= self.jobs:
+                        break
+                    waiting.remove(position)
+                    meta = recipes_and_dist_locn[position][0]
+                    print('Scheduling build of', meta.dist())
+                    # A process per build (rather than a pool) so that a
+                    # process which dies is noticed.
+                    process = multiprocessing.Process(target=_build_worker,
+                                                      args=(results, position, meta, config))
+                    process.daemon = True
+                    process.start()
+                    running[position] = process
+                if not running:
+                    if not waiting:
+                        break
+                    # Nothing is being built, so wait for the deliveries the
+                    # remaining builds depend on.
+                    if undelivered:
+                        deliver_existing(block=True)
+                        continue
+                    deps = set(dep for position in waiting
+                               for dep in self.recipe_dependencies.get(names[position], [])
+                               if stage.pending(dep))
+                    if not deps:
+                        raise ValueError('Unable to schedule the remaining builds: '
+                                         '{}'.format(', '.join(names[position]
+                                                               for position in waiting)))
+                    stage.wait_for(deps)
+                    continue
+
+                while undelivered and deliver_existing(block=False):
+                    pass
+
+                result = _next_build_result(results, running)
+                if result is None:
+                    # A delivery finished.
+                    continue
+                position, output_paths, error = result
+                running.pop(position).join()
+                # The builds overlap, so the build stage is timed from the
+                # start until the last build finishes.
+                build_time = time.time() - start
+                meta = recipes_and_dist_locn[position][0]
+                if error:
+                    raise RuntimeError('Building {} failed:\n{}'.format(meta.dist(), error))
+                conda_build.api.update_index(set(os.path.dirname(path)
+                                                 for path in output_paths),
+                                             config=config)
+                unfinished[names[position]] -= 1
+                stage.put(meta, output_paths, True)
+            while undelivered:
+                deliver_existing(block=True)
+        except BaseException:
+            for process in running.values():
+                process.terminate()
+                process.join()
+            _log_failure(stage.close)
+            raise
+        stage.close()
+        self._report_stage_times(build_time, stage, time.time() - start)
 
     def post_build(self, meta, built_dist_location, was_built, config=None):
         """
@@ -317,3 +1032,21 @@ class Builder(object):
         for artefact_destination in self.artefact_destinations:
             artefact_destination.make_available(meta, built_dist_location, was_built,
                                                 config=config)
+
+    def flush_artefact_destinations(self):
+        """
+        Wait for each of the artefact destinations to make its distributions
+        available (some destinations do so in the background). Every
+        destination is flushed, and then any failures are raised together.
+
+        """
+        failures = []
+        for artefact_destination in self.artefact_destinations:
+            try:
+                artefact_destination.flush()
+            except Exception as err:
+                failures.append(err)
+        if len(failures) == 1:
+            raise failures[0]
+        elif failures:
+            raise RuntimeError('\n'.join(str(err) for err in failures))
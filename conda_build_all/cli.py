@@ -7,6 +7,7 @@ import conda_build.config
 import conda_build_all
 import conda_build_all.builder
 import conda_build_all.artefact_destination as artefact_dest
+import conda_build_all.repodata
 
 
 def main():
@@ -32,17 +33,61 @@ def main():
         action='store_true',
         help='Skip all builds, just list what distribution would be built.')
 
+    parser.add_argument('--render-jobs', default=1, type=int,
+        help=('The number of processes to use when rendering the recipes. '
+              '(default: 1)'))
+    parser.add_argument('--render-cache', default=False,
+        action='store_true',
+        help=('Re-use the rendered metadata of unchanged recipes from '
+              'previous runs. A recipe is unchanged if the content of its '
+              'directory is, so only use this if the recipes do not depend '
+              'on anything else (e.g. environment variables or '
+              'load_setup_py_data).'))
+
+    parser.add_argument('--matrix-jobs', default=1, type=int,
+        help=('The number of processes to use when computing the build '
+              'matrix. (default: 1)'))
+
+    parser.add_argument('--no-existence-precheck', default=False,
+        action='store_true',
+        help=('Solve the build matrix of every recipe, even those for which '
+              'distributions already exist in the inspection locations.'))
+
+    parser.add_argument('--jobs', default=1, type=int,
+        help=('The number of distributions to build concurrently. '
+              'Distributions are built as soon as the in-repo '
+              'distributions that they depend on have been built. '
+              '(default: 1)'))
+
+    parser.add_argument('--delivery-queue', default=0, type=int,
+        help=('The maximum number of built distributions waiting to be '
+              'delivered to the artefact destinations (copied, uploaded or '
+              'added to channels) in the background whilst the builds '
+              'continue. A build only waits for the delivery of the '
+              'distributions it depends on. 0 delivers each distribution '
+              'before the next build starts. (default: 0)'))
+
     parser.add_argument('--artefact-directory',
         help='A directory for any newly built distributions to be placed.')
     parser.add_argument('--upload-channels', nargs='*', default=[],
         help=('The channel(s) to upload built distributions to (requires '
               'BINSTAR_TOKEN envioronment variable).'))
+    parser.add_argument('--upload-jobs', default=0, type=int,
+        help=('The maximum number of uploads (to each upload channel) to run '
+              'concurrently, in the background whilst the builds continue. '
+              'Failed uploads are then reported once all of the builds are '
+              'complete. By default, each distribution is uploaded before '
+              'moving on to the next. (default: 0)'))
 
     parser.add_argument("--matrix-conditions", nargs='*', default=[],
         help=("Extra conditions for computing the build matrix "
               "(e.g. 'python 2.7.*'). Note, your build matrix may also be being "
               "limited by --matrix-max-n-major-versions and "
               "--matrix-max-n-minor-versions."))
+    parser.add_argument("--no-solve-cache", default=False,
+        action='store_true',
+        help=("Don't re-use the results of solves from previous runs when "
+              "computing the build matrix."))
     parser.add_argument("--matrix-max-n-major-versions", default=2, type=int,
         help=("When computing the build matrix, limit to the latest n major "
               "versions (0 makes this unlimited). For example, if Python 1, "
@@ -76,7 +121,8 @@ def main():
 
     artefact_destinations = []
     for channel in args.upload_channels:
-        dest = artefact_dest.AnacondaClientChannelDest.from_spec(channel)
+        dest = artefact_dest.AnacondaClientChannelDest.from_spec(
+            channel, upload_jobs=args.upload_jobs)
         artefact_destinations.append(dest)
     if args.artefact_directory:
         dest = artefact_dest.DirectoryDestination(args.artefact_directory)
@@ -84,12 +130,24 @@ def main():
 
     artefact_dest.log.setLevel(logging.INFO)
     artefact_dest.log.addHandler(logging.StreamHandler())
+    # Report the time taken to fetch each of the inspection channels.
+    conda_build_all.repodata.log.setLevel(logging.INFO)
+    conda_build_all.repodata.log.addHandler(logging.StreamHandler())
+    # Report the failures (e.g. of deliveries) while a failed build is raised.
+    conda_build_all.builder.log.addHandler(logging.StreamHandler())
 
     b = conda_build_all.builder.Builder(args.recipes, args.inspect_channels,
                                         inspection_directories,
                                         artefact_destinations,
                                         args.matrix_conditions,
-                                        max_n_versions, args.dry_run)
+                                        max_n_versions, args.dry_run,
+                                        render_jobs=args.render_jobs,
+                                        render_cache=args.render_cache,
+                                        jobs=args.jobs,
+                                        solve_cache=not args.no_solve_cache,
+                                        matrix_jobs=args.matrix_jobs,
+                                        existence_precheck=not args.no_existence_precheck,
+                                        delivery_queue=args.delivery_queue)
     b.main()
 
 
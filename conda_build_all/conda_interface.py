@@ -1,6 +1,12 @@
 # -*- coding: utf-8 -*-
 from __future__ import absolute_import, division, print_function
 
+from collections import OrderedDict
+try:
+    from collections.abc import MutableMapping
+except ImportError:
+    from collections import MutableMapping
+
 from conda import __version__ as CONDA_VERSION
 
 CONDA_VERSION_MAJOR_MINOR = tuple(int(x) for x in CONDA_VERSION.split('.')[:2])
@@ -25,6 +31,11 @@ if (4, 3) <= CONDA_VERSION_MAJOR_MINOR < (4, 4):
     def ensure_dist_or_dict(fn):
         return _Dist.from_string(fn)
 
+    def _index_key(key):
+        if isinstance(key, string_types):
+            key = _Dist(key)
+        return key
+
     from conda.console import setup_verbose_handlers
     setup_verbose_handlers()
     from conda.gateways.logging import initialize_logging
@@ -50,6 +61,9 @@ elif (4, 2) <= CONDA_VERSION_MAJOR_MINOR < (4, 3):
     def ensure_dist_or_dict(fn):
         return fn
 
+    def _index_key(key):
+        return key
+
     # We need to import conda.fetch and conda.resolve to trigger the
     # creation of the loggers.
     import conda.fetch
@@ -60,9 +74,326 @@ else:
                               % (CONDA_VERSION, str(CONDA_VERSION_MAJOR_MINOR)))
 
 
+from conda.models.channel import prioritize_channels
+try:
+    from conda.connection import CondaSession
+except ImportError:
+    from requests import Session as CondaSession
+
+
+def channel_urls(channels):
+    """
+    Return the (platform and noarch) repodata URLs of the given channel
+    names or URLs, in priority order, with no trailing slashes.
+
+    """
+    urls = []
+    for url in prioritize_channels(list(channels)):
+        url = url.rstrip('/')
+        if url not in urls:
+            urls.append(url)
+    return urls
+
+
 subdir = subdir
 Locked = Locked
 Resolve, get_index = Resolve, get_index
 MatchSpec = MatchSpec
 Unsatisfiable, NoPackagesFound = Unsatisfiable, NoPackagesFound
 string_types = string_types
+
+
+def index_by_name(index):
+    """Return a dictionary mapping package name to the keys of the index."""
+    if isinstance(index, OverlayIndex):
+        return index.by_name()
+    by_name = {}
+    for key, info in index.items():
+        by_name.setdefault(info['name'], []).append(key)
+    return by_name
+
+
+def requirement_closure(names, index, by_name=None):
+    """
+    Return the names of all the packages in the index which may take part in
+    a solve for the given package names - that is, those reachable from the
+    given names through the ``depends`` of the index, along with any package
+    which tracks a feature of one of those.
+
+    """
+    if by_name is None:
+        by_name = index_by_name(index)
+    closure = set()
+    features = set()
+    todo = list(names)
+    while todo:
+        name = todo.pop()
+        if name in closure:
+            continue
+        closure.add(name)
+        for key in by_name.get(name, ()):
+            info = index[key]
+            depends = list(info.get('depends', ()))
+            # Older versions of conda may have feature specific dependencies.
+            for feature_depends in (info.get('with_features_depends') or {}).values():
+                depends.extend(feature_depends)
+            for dep in depends:
+                dep_name = dep.split()[0]
+                if dep_name not in closure:
+                    todo.append(dep_name)
+            new_features = set((info.get('features') or '').split()) - features
+            if new_features:
+                features.update(new_features)
+                # The solver considers the packages which track the features
+                # too. These are rare, so we can afford to look for them here.
+                for other in index.values():
+                    tracked = set((other.get('track_features') or '').split())
+                    if tracked & new_features and other['name'] not in closure:
+                        todo.append(other['name'])
+    return closure
+
+
+class OverlayIndex(MutableMapping):
+    """
+    A copy-on-write view of an index (a mapping of distribution to its
+    record), which reads through to the base index and only stores the
+    records that are added to it.
+
+    This can be used anywhere an index can, including to construct a
+    :class:`Resolve`, and copying it only copies the added records. The base
+    index must not be modified whilst the overlay is in use.
+
+    """
+    def __init__(self, base, added=None, _base_by_name=None):
+        self.base = base
+        self.added = {}
+        if added:
+            for key, info in added.items():
+                self[key] = info
+        self._base_by_name = _base_by_name
+
+    def __repr__(self):
+        return '<{} of {} records, with {} added>'.format(
+            type(self).__name__, len(self.base), len(self.added))
+
+    def __getitem__(self, key):
+        key = _index_key(key)
+        try:
+            return self.added[key]
+        except KeyError:
+            return self.base[key]
+
+    def __setitem__(self, key, info):
+        self.added[_index_key(key)] = info
+
+    def __delitem__(self, key):
+        key = _index_key(key)
+        if key not in self.added and key in self.base:
+            raise KeyError('{} is part of the base index, and cannot be '
+                           'removed from an overlay.'.format(key))
+        del self.added[key]
+
+    def __contains__(self, key):
+        key = _index_key(key)
+        return key in self.added or key in self.base
+
+    def __iter__(self):
+        for key in self.added:
+            yield key
+        for key in self.base:
+            if key not in self.added:
+                yield key
+
+    def __len__(self):
+        return len(self.base) + sum(1 for key in self.added
+                                    if key not in self.base)
+
+    def copy(self):
+        return type(self)(self.base, self.added, self._base_by_name)
+
+    def by_name(self):
+        """
+        Return a dictionary mapping package name to the keys of the index.
+
+        The grouping of the base index is computed once and then shared with
+        copies of this overlay.
+
+        """
+        if self._base_by_name is None:
+            if isinstance(self.base, OverlayIndex):
+                by_name = self.base.by_name()
+            else:
+                by_name = {}
+                for key, info in self.base.items():
+                    by_name.setdefault(info['name'], []).append(key)
+            self._base_by_name = by_name
+        by_name = dict(self._base_by_name)
+        copied = set()
+        for key, info in self.added.items():
+            if key in self.base:
+                continue
+            name = info['name']
+            # Copy the list of keys before adding to it, so as not to modify
+            # the base grouping.
+            if name not in copied:
+                by_name[name] = list(by_name.get(name, ()))
+                copied.add(name)
+            by_name[name].append(key)
+        return by_name
+
+
+class IncrementalResolve(object):
+    """
+    A long-lived :class:`Resolve` of an index, to which records can be
+    added without reconstructing the resolver (and losing its caches).
+
+    The resolver is constructed on first use. Records added subsequently are
+    absorbed into its index, package groups and feature trackers, and only
+    the cached matches for the package name of the new record are dropped.
+    Should a record need processing that only the Resolve constructor can
+    do, the resolver is simply constructed again on next use.
+
+    Only the most recently used requirement closures and pruned resolvers
+    (see :meth:`pruned`) are kept, as each of the latter holds a Resolve of
+    its part of the index.
+
+    """
+    #: The maximum number of requirement closures to keep.
+    max_closures = 256
+    #: The maximum number of pruned resolvers to keep.
+    max_pruned = 8
+
+    def __init__(self, index):
+        self.index = index
+        self._resolve = None
+        #: The number of times that a Resolve has been constructed.
+        self.n_constructed = 0
+        # The requirement closures and the resolvers of the correspondingly
+        # pruned index, keyed on the names of the root packages, from the
+        # least to the most recently used.
+        self._closures = OrderedDict()
+        self._pruned = OrderedDict()
+
+    def __repr__(self):
+        return '<{} of {} records>'.format(type(self).__name__, len(self.index))
+
+    @property
+    def resolve(self):
+        if self._resolve is None:
+            self._resolve = Resolve(self.index)
+            self.n_constructed += 1
+        return self._resolve
+
+    def add(self, key, info):
+        """Add the given record to the index, and the resolver."""
+        key = _index_key(key)
+        # Feature variants (and replacements) of a record are only dealt
+        # with when constructing a Resolve.
+        absorbable = (key not in self.index and
+                      not info.get('with_features_depends'))
+        self.index[key] = info
+        if self._resolve is not None:
+            if not absorbable:
+                self._resolve = None
+                return
+            try:
+                self._absorb(key, info)
+            except AttributeError:
+                # The internals of this Resolve aren't as expected.
+                self._resolve = None
+
+        # Keep the pruned resolvers up to date. If the new record could
+        # extend a closure, the closure (and its resolver) is computed
+        # again when next needed.
+        name = info['name']
+        depends = set(dep.split()[0] for dep in info.get('depends', ()))
+        features = info.get('features') or info.get('track_features')
+        for names, closure in list(self._closures.items()):
+            if name not in closure and not features:
+                continue
+            if name in closure and depends <= closure and absorbable and not features:
+                if names in self._pruned:
+                    self._pruned[names].add(key, info)
+            else:
+                del self._closures[names]
+                self._pruned.pop(names, None)
+
+    def closure(self, names):
+        """
+        Return the (memoized) :func:`requirement_closure` of the given
+        package names over the index.
+
+        """
+        names = frozenset(names)
+        closure = self._closures.pop(names, None)
+        if closure is None:
+            closure = requirement_closure(names, self.index)
+        self._closures[names] = closure
+        while len(self._closures) > self.max_closures:
+            evicted, _ = self._closures.popitem(last=False)
+            # A pruned resolver is only kept up to date whilst its closure
+            # is known.
+            self._pruned.pop(evicted, None)
+        return closure
+
+    def pruned(self, names):
+        """
+        Return an IncrementalResolve (memoized) of just the part of the index
+        which can take part in a solve for the given package names - see
+        :meth:`closure`. Solving against this is equivalent to solving
+        against the whole index, but the problem given to the SAT solver is
+        much smaller.
+
+        """
+        names = frozenset(names)
+        # Also marks the closure as recently used, so it outlives the resolver.
+        closure = self.closure(names)
+        pruned = self._pruned.pop(names, None)
+        if pruned is None:
+            by_name = index_by_name(self.index)
+            pruned_index = {}
+            for name in closure:
+                for key in by_name.get(name, ()):
+                    pruned_index[key] = self.index[key]
+            pruned = IncrementalResolve(pruned_index)
+        self._pruned[names] = pruned
+        while len(self._pruned) > self.max_pruned:
+            self._pruned.popitem(last=False)
+        return pruned
+
+    def _absorb(self, key, info):
+        r = self._resolve
+        if r.index is not self.index:
+            r.index[key] = info
+        # Register the features of the record, as constructing a Resolve
+        # does. This must precede tracking the record, as a new feature's
+        # trackers are reset.
+        features = ((info.get('features') or '').split() +
+                    (info.get('track_features') or '').split())
+        for feature in features:
+            r.add_feature(feature)
+        r.groups.setdefault(info['name'], []).append(key)
+        for feature in (info.get('track_features') or '').split():
+            r.trackers.setdefault(feature, []).append(key)
+        # The names of the record, and of the (pseudo-)packages of its features.
+        names = set([info['name']]) | set(feature + '@' for feature in features)
+        for spec in [spec for spec in r.find_matches_ if spec.name in names]:
+            del r.find_matches_[spec]
+        # Reductions of the index (conda >=4.3) may involve any package.
+        if getattr(r, '_reduced_index_cache', None):
+            r._reduced_index_cache.clear()
+
+    def solve(self, specs, **kwargs):
+        return self.resolve.solve(specs, **kwargs)
+
+    def solve_pruned(self, specs, **kwargs):
+        """
+        Solve the given specs against the part of the index that they can
+        reach, see :meth:`pruned`.
+
+        """
+        names = [spec.split()[0] for spec in specs]
+        return self.pruned(names).solve(specs, **kwargs)
+
+    def get_pkgs(self, spec, **kwargs):
+        return self.resolve.get_pkgs(spec, **kwargs)
@@ -0,0 +1,159 @@
+"""
+The delivery (post-build) stage of a run of the builder.
+
+Delivering a distribution to the artefact destinations (copying it to a
+directory, adding it to a channel, uploading it) doesn't need to hold up the
+build of the next distribution. A :class:`DeliveryStage` runs the deliveries
+in a background thread, in the order they were given, with a bounded queue
+between the builds and the deliveries. The packages whose delivery failed are
+recorded, so that nothing which depends on them is built.
+
+"""
+from __future__ import division
+
+import threading
+import time
+import traceback
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+
+class DeliveryStage(object):
+    """
+    Delivers distributions, in the order they are given, in the background.
+
+    Parameters
+    ----------
+    deliver : callable
+        Called with the ``(meta, built_dist_location, was_built)`` of each
+        distribution given to :meth:`put`.
+    maxsize : int
+        The maximum number of distributions which may be waiting to be
+        delivered; beyond that, :meth:`put` blocks. If 0, each distribution
+        is delivered by :meth:`put` itself (and any failure raised there).
+    on_delivered : callable
+        Called (with no arguments) from the background thread after each
+        delivery, successful or not. For example, to wake a scheduler which
+        is waiting for something else.
+
+    Attributes
+    ----------
+    delivery_time : float
+        The number of seconds spent delivering distributions.
+    wait_time : float
+        The number of seconds spent waiting for deliveries, in :meth:`put`
+        and :meth:`wait_for`.
+
+    """
+    def __init__(self, deliver, maxsize=0, on_delivered=None):
+        self.deliver = deliver
+        self.maxsize = maxsize
+        self.on_delivered = on_delivered
+        self.delivery_time = 0.0
+        self.wait_time = 0.0
+        # package name -> the number of its distributions not yet delivered.
+        self._pending = {}
+        self._condition = threading.Condition()
+        # (meta, formatted traceback) of the failed deliveries.
+        self._failures = []
+        # The names of the packages with a failed delivery.
+        self._failed = set()
+        self._queue = None
+        self._thread = None
+        if maxsize > 0:
+            self._queue = queue.Queue(maxsize)
+            self._thread = threading.Thread(target=self._run)
+            self._thread.daemon = True
+            self._thread.start()
+
+    def __repr__(self):
+        return '<DeliveryStage: {} pending>'.format(sum(self._pending.values()))
+
+    def put(self, meta, built_dist_location, was_built, block=True):
+        """
+        Deliver the given distribution, in the background if possible.
+
+        If ``block`` is False and the queue is full, the distribution isn't
+        taken and False is returned. Otherwise, True is returned.
+
+        """
+        if self._queue is None:
+            self._deliver(meta, built_dist_location, was_built)
+            return True
+        with self._condition:
+            self._pending[meta.name()] = self._pending.get(meta.name(), 0) + 1
+        start = time.time()
+        try:
+            self._queue.put((meta, built_dist_location, was_built), block)
+        except queue.Full:
+            with self._condition:
+                self._pending[meta.name()] -= 1
+            return False
+        finally:
+            self.wait_time += time.time() - start
+        return True
+
+    def pending(self, name):
+        """The number of distributions of the named package not yet delivered."""
+        with self._condition:
+            return self._pending.get(name, 0)
+
+    def failed(self, name):
+        """Whether a (background) delivery of the named package has failed."""
+        with self._condition:
+            return name in self._failed
+
+    def wait_for(self, names):
+        """Block until every distribution of the named packages has been delivered."""
+        start = time.time()
+        with self._condition:
+            while any(self._pending.get(name) for name in names):
+                self._condition.wait()
+        self.wait_time += time.time() - start
+
+    def close(self):
+        """
+        Wait for every distribution to be delivered, and stop the background
+        thread. If any of the deliveries failed, a RuntimeError listing all
+        of them is raised.
+
+        """
+        if self._thread is not None:
+            self._queue.put(None)
+            start = time.time()
+            self._thread.join()
+            self.wait_time += time.time() - start
+            self._thread = None
+        if self._failures:
+            failures, self._failures = self._failures, []
+            raise RuntimeError('Failed to deliver {} distribution(s):\n{}'.format(
+                len(failures), '\n'.join('{}:\n{}'.format(meta.dist(), error)
+                                         for meta, error in failures)))
+
+    def _deliver(self, meta, built_dist_location, was_built):
+        start = time.time()
+        try:
+            self.deliver(meta, built_dist_location, was_built)
+        finally:
+            self.delivery_time += time.time() - start
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            meta = item[0]
+            try:
+                self._deliver(*item)
+            except Exception:
+                with self._condition:
+                    self._failed.add(meta.name())
+                self._failures.append((meta, traceback.format_exc()))
+            finally:
+                with self._condition:
+                    self._pending[meta.name()] -= 1
+                    self._condition.notify_all()
+            if self.on_delivered is not None:
+                self.on_delivered()
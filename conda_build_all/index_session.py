@@ -0,0 +1,107 @@
+"""
+The channel data of a single run of the builder.
+
+The build index, its resolver, and the repodata of the inspection channels
+are each fetched (and parsed) at most once per run, and are shared by every
+phase of the run.
+
+"""
+from .conda_interface import (get_index, copy_index, OverlayIndex,
+                              IncrementalResolve)
+from .repodata import ChannelSnapshot, RepodataCache
+
+
+class IndexSession(object):
+    """
+    Holds the channel data of a single run of the builder.
+
+    Parameters
+    ----------
+    config
+        The conda-build configuration of the run. If given, the repodata of
+        the inspection channels is cached in its conda-build root between
+        runs.
+    index : dict
+        The build index. If not given, it is fetched (with ``get_index``)
+        when first needed.
+    repodata_cache : conda_build_all.repodata.RepodataCache
+        The fetch layer for the inspection channels.
+
+    """
+    def __init__(self, config=None, index=None, repodata_cache=None):
+        if repodata_cache is None:
+            if config is not None:
+                repodata_cache = RepodataCache.from_config(config)
+            else:
+                repodata_cache = RepodataCache()
+        self.repodata_cache = repodata_cache
+        self._index = index
+        self._resolver = None
+        # url -> ChannelSnapshot
+        self._snapshots = {}
+        # Whether the channels of the build index are in the snapshots.
+        self._index_snapshots = False
+
+    def __repr__(self):
+        return '<IndexSession: index {}loaded, {} channel snapshots>'.format(
+            '' if self._index is not None else 'not ', len(self._snapshots))
+
+    @property
+    def index(self):
+        """The build index."""
+        if self._index is None:
+            self._index = get_index(use_cache=False)
+        return self._index
+
+    @property
+    def resolver(self):
+        """
+        An :class:`~conda_build_all.conda_interface.IncrementalResolve` of an
+        overlay of the build index. Records may be added to it without
+        modifying the index.
+
+        """
+        if self._resolver is None:
+            self._resolver = IncrementalResolve(OverlayIndex(copy_index(self.index)))
+        return self._resolver
+
+    def latest_package(self, name):
+        """
+        Return the latest package (a conda ``Package``) of the given name in
+        the build index, or None if there isn't one.
+
+        Only the part of the index which is relevant to the package is given
+        to the resolver, and that resolver is kept for the solves that follow.
+
+        """
+        pkgs = self.resolver.pruned([name]).get_pkgs(name, emptyok=True)
+        return max(pkgs) if pkgs else None
+
+    def snapshots(self, urls):
+        """
+        Return a :class:`~conda_build_all.repodata.ChannelSnapshot` for each
+        of the given channel (platform) URLs.
+
+        Channels which are part of the (already loaded) build index are
+        taken from it, rather than being fetched again, as are channels
+        which have already been fetched in this session.
+
+        """
+        urls = [url.rstrip('/') for url in urls]
+        if self._index is not None and not self._index_snapshots:
+            self._index_snapshots = True
+            for url, fnames in self._index_channels().items():
+                self._snapshots.setdefault(url, ChannelSnapshot(url, fnames, from_cache=True))
+        missing = [url for url in urls if url not in self._snapshots]
+        for snapshot in self.repodata_cache.fetch_all(missing):
+            self._snapshots[snapshot.url] = snapshot
+        return [self._snapshots[url] for url in urls]
+
+    def _index_channels(self):
+        # The artefact filenames of the build index, by channel URL.
+        channels = {}
+        for info in self._index.values():
+            channel = info.get('channel')
+            if channel and 'fn' in info:
+                channels.setdefault(channel.rstrip('/'), set()).add(info['fn'])
+        return channels
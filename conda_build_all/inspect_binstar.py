@@ -1,8 +1,10 @@
-# NOTE: This module has no unit tests.
+import threading
+import weakref
 
 import binstar_client
 from conda_build.build import bldpkg_path
-from .conda_interface import get_index, subdir
+from .conda_interface import get_index, subdir, channel_urls
+from .repodata import RepodataCache
 
 
 def distribution_exists(binstar_cli, owner, metadata):
@@ -10,6 +12,8 @@ def distribution_exists(binstar_cli, owner, metadata):
     Determine whether a distribution exists.
 
     This does not check specific channels - it is either on binstar or it is not.
+    When checking many distributions, use an :class:`OwnerInventory`.
+
     """
     fname = '{}/{}.tar.bz2'.format(subdir, metadata.dist())
     try:
@@ -21,6 +25,172 @@ def distribution_exists(binstar_cli, owner, metadata):
     return exists
 
 
+class OwnerInventory(object):
+    """
+    The files that an owner has on binstar, for the packages asked about.
+
+    Each package is listed (with all of its releases and files) in a single
+    request, the first time it is asked about, rather than requesting each
+    distribution individually. The inventory is then kept up to date locally
+    as packages, releases and files are added or removed through it. The
+    inventory may be shared between threads; use :func:`owner_inventory` to
+    share it between everything using the same client.
+
+    A thread other than the one which uses the inventory's client should pass
+    its own client (``binstar_cli``) to the lookups, so that no client (and
+    hence no session) is used by more than one thread.
+
+    Parameters
+    ----------
+    binstar_cli
+        The binstar client used to list the packages, unless a lookup is
+        given another.
+    owner : str
+        The owner (user or organisation) whose files are listed.
+
+    """
+    def __init__(self, binstar_cli, owner):
+        self.binstar_cli = binstar_cli
+        self.owner = owner
+        # package name -> {'versions': set, 'files': {basename: file info}},
+        # or None if the owner doesn't have the package.
+        self._packages = {}
+        #: The number of requests made to list packages.
+        self.n_requests = 0
+        #: The number of lookups answered without a request.
+        self.n_skipped = 0
+        #: (basename, decision) of each upload through the inventory.
+        self.upload_decisions = []
+        self._lock = threading.RLock()
+        # package name -> the lock held whilst creating the package or its releases.
+        self._package_locks = {}
+
+    def __repr__(self):
+        return '<OwnerInventory {}: {} packages listed>'.format(self.owner, len(self._packages))
+
+    def load(self, names, binstar_cli=None):
+        """Load the listing of each of the given package names (if not already loaded)."""
+        for name in names:
+            self._package(name, binstar_cli)
+
+    def _package(self, name, binstar_cli=None):
+        with self._lock:
+            if name not in self._packages:
+                try:
+                    package = (binstar_cli or self.binstar_cli).package(self.owner, name)
+                except binstar_client.NotFound:
+                    entry = None
+                else:
+                    files = {info['basename']: info for info in package.get('files', [])}
+                    versions = set(package.get('versions', []))
+                    versions.update(info['version'] for info in files.values()
+                                    if 'version' in info)
+                    entry = {'versions': versions, 'files': files}
+                self.n_requests += 1
+                self._packages[name] = entry
+            else:
+                self.n_skipped += 1
+            return self._packages[name]
+
+    def package_lock(self, name):
+        """
+        Return the lock of the named package. Hold it to check for, and
+        create, the package and its releases, such that concurrent uploads
+        don't both create them.
+
+        """
+        with self._lock:
+            return self._package_locks.setdefault(name, threading.Lock())
+
+    def package_exists(self, name, binstar_cli=None):
+        """Whether the owner has a package of the given name."""
+        return self._package(name, binstar_cli) is not None
+
+    def release_exists(self, name, version, binstar_cli=None):
+        """Whether the owner has the given release of the named package."""
+        package = self._package(name, binstar_cli)
+        return package is not None and version in package['versions']
+
+    def file_info(self, name, basename, binstar_cli=None):
+        """
+        Return the binstar file information (a dict, including checksums
+        for files that were listed) of the given file of the named package,
+        or None if the owner doesn't have the file. The basename includes
+        the platform subdirectory, e.g. ``linux-64/a-1.0-0.tar.bz2``.
+
+        """
+        package = self._package(name, binstar_cli)
+        if package is None:
+            return None
+        return package['files'].get(basename)
+
+    def distribution_exists(self, metadata, binstar_cli=None):
+        """Whether the owner has the distribution of the given metadata."""
+        basename = '{}/{}.tar.bz2'.format(subdir, metadata.dist())
+        return self.file_info(metadata.name(), basename, binstar_cli) is not None
+
+    # Packages which haven't been listed are left alone by the following;
+    # they are listed (with the changes) when first asked about.
+
+    def add_package(self, name):
+        """Record that the owner now has a package of the given name."""
+        with self._lock:
+            if name in self._packages and self._packages[name] is None:
+                self._packages[name] = {'versions': set(), 'files': {}}
+
+    def add_release(self, name, version):
+        """Record that the owner now has the given release of the named package."""
+        with self._lock:
+            self.add_package(name)
+            if self._packages.get(name) is not None:
+                self._packages[name]['versions'].add(version)
+
+    def add_file(self, name, version, basename, info=None):
+        """Record that the owner now has the given file of the named package."""
+        info = dict(info or {})
+        info.update(basename=basename, version=version)
+        with self._lock:
+            self.add_release(name, version)
+            if self._packages.get(name) is not None:
+                self._packages[name]['files'][basename] = info
+
+    def remove_file(self, name, basename):
+        """Record that the owner no longer has the given file of the named package."""
+        with self._lock:
+            if self._packages.get(name) is not None:
+                self._packages[name]['files'].pop(basename, None)
+
+    def record_upload(self, basename, decision):
+        """Record what was decided when uploading the given file."""
+        with self._lock:
+            self.upload_decisions.append((basename, decision))
+
+    def pop_upload_decisions(self):
+        """Return (and forget) the upload decisions recorded so far."""
+        with self._lock:
+            decisions, self.upload_decisions = self.upload_decisions, []
+        return decisions
+
+
+# binstar client -> {owner: OwnerInventory}
+_inventories = weakref.WeakKeyDictionary()
+_inventories_lock = threading.Lock()
+
+
+def owner_inventory(binstar_cli, owner):
+    """
+    Return the :class:`OwnerInventory` of the given owner, shared by
+    everything using the given client for as long as the client exists.
+
+    """
+    with _inventories_lock:
+        inventories = _inventories.setdefault(binstar_cli, {})
+        if owner not in inventories:
+            # A proxy, so that the inventory doesn't keep the client alive.
+            inventories[owner] = OwnerInventory(weakref.proxy(binstar_cli), owner)
+        return inventories[owner]
+
+
 def distribution_exists_on_channel(binstar_cli, owner, metadata, channel='main'):
     """
     Determine whether a distribution exists on a specific channel.
@@ -42,6 +212,27 @@ def distribution_exists_on_channel(binstar_cli, owner, metadata, channel='main')
     return on_channel
 
 
+def channel_distributions(owner, channel='main', repodata_cache=None):
+    """
+    Return the set of distribution filenames on a specific channel of the
+    owner, for this platform.
+
+    Unlike :func:`distribution_exists_on_channel`, only the filenames are
+    extracted from the channel's repodata, so the result is suitable for
+    checking many distributions at once.
+
+    """
+    if repodata_cache is None:
+        repodata_cache = RepodataCache()
+    channel_url = '/'.join([owner, 'label', channel])
+    urls = [url for url in channel_urls([channel_url])
+            if url.endswith('/' + subdir)]
+    fnames = set()
+    for snapshot in repodata_cache.fetch_all(urls):
+        fnames.update(snapshot.fnames)
+    return fnames
+
+
 def add_distribution_to_channel(binstar_cli, owner, metadata, channel='main'):
     """
     Add a(n already existing) distribution on binstar to another channel.
@@ -0,0 +1,166 @@
+"""
+Cached listings of the conda artefacts in local directories, such as the
+inspection directories of a build.
+
+Listing a directory of many thousands of artefacts (particularly on a
+network filesystem) is slow, so a listing is read from the directory's
+repodata.json where that is up to date, and is otherwise made with a single
+pass over the directory. Listings are cached, and are re-used for as long as
+the modification time of the directory is unchanged.
+
+"""
+import hashlib
+import json
+import logging
+import os
+import tempfile
+
+try:
+    from os import scandir
+except ImportError:
+    scandir = None
+
+
+log = logging.getLogger(__name__)
+
+#: The filename extensions of conda artefacts.
+ARTEFACT_EXTENSIONS = ('.tar.bz2', '.conda')
+
+
+def dist_name(fname):
+    """
+    Return the distribution name of the given artefact filename (e.g.
+    ``numpy-1.10.4-py27_0`` for ``numpy-1.10.4-py27_0.conda``), or None if
+    the filename isn't that of an artefact.
+
+    """
+    fname = os.path.basename(fname)
+    for extension in ARTEFACT_EXTENSIONS:
+        if fname.endswith(extension):
+            return fname[:-len(extension)]
+    return None
+
+
+def _listdir(directory):
+    if scandir is not None:
+        return [entry.name for entry in scandir(directory)]
+    return os.listdir(directory)
+
+
+def scan_artefacts(directory):
+    """Return the set of artefact filenames in the given directory."""
+    return set(fname for fname in _listdir(directory)
+               if dist_name(fname) is not None)
+
+
+def repodata_artefacts(directory, directory_mtime=None):
+    """
+    Return the set of artefact filenames in the repodata.json of the given
+    directory, or None if there is no repodata.json, or it is older than
+    the directory. (An artefact added in the same second as repodata.json
+    was written may be missing from it, so there is no tolerance: a
+    repodata.json written by renaming a temporary file into place is
+    older than the directory, and the directory is listed instead.)
+
+    """
+    path = os.path.join(directory, 'repodata.json')
+    if directory_mtime is None:
+        directory_mtime = os.stat(directory).st_mtime
+    try:
+        if os.stat(path).st_mtime < directory_mtime:
+            return None
+        with open(path) as fh:
+            repodata = json.load(fh)
+    except (IOError, OSError, ValueError):
+        return None
+    fnames = set()
+    for key in ('packages', 'packages.conda'):
+        fnames.update(repodata.get(key, {}))
+    return fnames
+
+
+class DirectoryIndex(object):
+    """
+    A cache of the artefact filenames in directories, validated against the
+    modification time of each directory.
+
+    Parameters
+    ----------
+    cache_directory : str
+        A directory in which to persist the listings between runs. If not
+        given, the listings are only cached by this instance.
+
+    """
+    def __init__(self, cache_directory=None):
+        self.cache_directory = cache_directory
+        # directory -> (mtime, frozenset of artefact filenames)
+        self._listings = {}
+
+    @classmethod
+    def from_config(cls, config):
+        """Create a DirectoryIndex which persists in the conda-build root of the given config."""
+        return cls(os.path.join(config.croot, 'conda-build-all', 'directory-index'))
+
+    def __repr__(self):
+        return '<DirectoryIndex of {} directories>'.format(len(self._listings))
+
+    def artefacts(self, directory):
+        """
+        Return the (frozen) set of artefact filenames in the given directory.
+        A directory which doesn't exist has no artefacts.
+
+        """
+        directory = os.path.abspath(directory)
+        try:
+            mtime = os.stat(directory).st_mtime
+        except OSError:
+            return frozenset()
+        cached = self._listings.get(directory)
+        if cached is None:
+            cached = self._load(directory)
+        if cached is not None and cached[0] == mtime:
+            fnames = cached[1]
+        else:
+            fnames = repodata_artefacts(directory, mtime)
+            if fnames is None:
+                log.debug('Listing the artefacts in {}'.format(directory))
+                fnames = scan_artefacts(directory)
+            fnames = frozenset(fnames)
+            self._store(directory, mtime, fnames)
+        self._listings[directory] = (mtime, fnames)
+        return fnames
+
+    def _path(self, directory):
+        key = hashlib.sha1(directory.encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_directory, key + '.json')
+
+    def _load(self, directory):
+        if self.cache_directory is None:
+            return None
+        try:
+            with open(self._path(directory)) as fh:
+                entry = json.load(fh)
+        except (IOError, OSError, ValueError):
+            return None
+        if entry.get('directory') != directory:
+            return None
+        return entry['mtime'], frozenset(entry['fnames'])
+
+    def _store(self, directory, mtime, fnames):
+        if self.cache_directory is None:
+            return
+        try:
+            if not os.path.isdir(self.cache_directory):
+                os.makedirs(self.cache_directory)
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_directory, suffix='.tmp')
+            with os.fdopen(fd, 'w') as fh:
+                json.dump({'directory': directory, 'mtime': mtime,
+                           'fnames': sorted(fnames)}, fh)
+            path = self._path(directory)
+            if os.path.exists(path):
+                os.remove(path)
+            os.rename(tmp_path, path)
+        except (IOError, OSError) as err:
+            # Failing to cache is never fatal.
+            log.warning('Unable to write directory index for {} ({})'
+                        ''.format(directory, err))
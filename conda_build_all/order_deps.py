@@ -1,6 +1,28 @@
+from collections import deque
 import os
 
 
+def _find_cycle(package_dependencies, unresolved):
+    """
+    Return a list of packages forming a dependency cycle, where the first
+    and last items are the same package. Only the packages in ``unresolved``
+    (which must all be part of a cycle, or depend on one) are considered.
+
+    """
+    # Every unresolved package depends on at least one other unresolved
+    # package, so following those dependencies must eventually revisit a
+    # package. Always following the smallest name keeps this deterministic.
+    package = min(unresolved)
+    path = []
+    position = {}
+    while package not in position:
+        position[package] = len(path)
+        path.append(package)
+        package = min(dep for dep in package_dependencies[package]
+                      if dep in unresolved)
+    return path[position[package]:] + [package]
+
+
 def resolve_dependencies(package_dependencies):
     """
     Given a dictionary mapping a package to its dependencies, return a
@@ -12,32 +34,56 @@ def resolve_dependencies(package_dependencies):
     >>> list(deps)
     ['d', 'c', 'b', 'a']
 
+    Packages are ordered by the number of passes over the (sorted) remaining
+    packages that it would take for their dependencies to be satisfied, and
+    then by name. That is, within a pass a package may follow a dependency
+    which sorts before it, otherwise it must wait until the next pass.
+
     """
-    remaining_dependencies = package_dependencies.copy()
-    completed_packages = []
-
-    # A maximum of 10000 iterations. Beyond that and there is probably a
-    # problem.
-    for failsafe in range(10000):
-        for package, deps in sorted(remaining_dependencies.copy().items()):
-            if all(dependency in completed_packages for dependency in deps):
-                completed_packages.append(package)
-                remaining_dependencies.pop(package)
-                yield package
-            else:
-                # Put a check in to ensure that all the dependencies were
-                # defined as packages, otherwise we will never succeed.
-                for dependency in deps:
-                    if dependency not in package_dependencies:
-                        msg = ('The package {} depends on {}, but it was not '
-                               'part of the package_dependencies dictionary.'
-                               ''.format(package, dependency))
-                        raise ValueError(msg)
-
-        # Close off the loop if we've completed the dependencies.
-        if not remaining_dependencies:
-            break
-    else:
-        raise ValueError('Dependencies could not be resolved. '
-                         'Remaining dependencies: {}'
-                         ''.format(remaining_dependencies))
+    for package, deps in sorted(package_dependencies.items()):
+        # Check that all the dependencies were defined as packages, otherwise
+        # we will never succeed.
+        for dependency in deps:
+            if dependency not in package_dependencies:
+                msg = ('The package {} depends on {}, but it was not '
+                       'part of the package_dependencies dictionary.'
+                       ''.format(package, dependency))
+                raise ValueError(msg)
+
+    # Kahn's algorithm: a queue of packages with no outstanding dependencies,
+    # and a count of outstanding dependencies for all the others.
+    dependents = {package: [] for package in package_dependencies}
+    in_degree = {}
+    for package, deps in package_dependencies.items():
+        deps = set(deps)
+        in_degree[package] = len(deps)
+        for dependency in deps:
+            dependents[dependency].append(package)
+
+    ready = deque(sorted(package for package, count in in_degree.items()
+                         if count == 0))
+    passes = {package: 0 for package in ready}
+    resolved = []
+    while ready:
+        dependency = ready.popleft()
+        resolved.append(dependency)
+        for package in dependents[dependency]:
+            # The pass in which the package can be installed given this
+            # dependency: the same one if the dependency comes first in that
+            # pass, otherwise the one after.
+            pass_number = passes[dependency] + (0 if dependency < package else 1)
+            passes[package] = max(passes.get(package, 0), pass_number)
+            in_degree[package] -= 1
+            if in_degree[package] == 0:
+                ready.append(package)
+
+    if len(resolved) != len(package_dependencies):
+        unresolved = set(package for package, count in in_degree.items()
+                         if count > 0)
+        cycle = _find_cycle(package_dependencies, unresolved)
+        raise ValueError('Dependencies could not be resolved. Cyclic '
+                         'dependency: {}'.format(' -> '.join(cycle)))
+
+    resolved.sort(key=lambda package: (passes[package], package))
+    for package in resolved:
+        yield package
@@ -0,0 +1,214 @@
+"""
+A persistent, on-disk cache of rendered recipe metadata.
+
+Rendering a recipe (Jinja templating, YAML parsing, selector evaluation) is
+by far the most expensive part of discovering the recipes in a directory.
+The result is keyed on the location and content of the recipe directory and
+a handful of configuration values, and re-used between runs for recipes
+which haven't changed.
+
+Inputs from outside the recipe directory (environment variables, the source
+tree through ``load_setup_py_data``, etc.) are not part of the key, so the
+cache is only suitable for recipes which don't use them, and is opt-in.
+
+"""
+from copy import deepcopy
+import hashlib
+import logging
+import os
+import pickle
+import sys
+import tempfile
+
+import conda_build
+
+from .conda_interface import subdir
+
+
+log = logging.getLogger(__name__)
+
+#: The configuration attributes which influence the rendered metadata.
+CONFIG_KEY_ATTRIBUTES = ('CONDA_PY', 'CONDA_NPY', 'CONDA_PERL', 'CONDA_R',
+                         'subdir', 'variant', 'variant_config_files',
+                         'exclusive_config_files')
+
+
+def recipe_digest(recipe_dir):
+    """
+    Return a digest of the content of the given recipe directory.
+
+    Sub-directories which are themselves recipes (contain a meta.yaml) are
+    not included, as they are rendered (and cached) in their own right.
+
+    """
+    digest = hashlib.sha256()
+    root = os.path.normpath(recipe_dir)
+    for dirpath, dirs, files in os.walk(root, followlinks=True):
+        if dirpath != root and 'meta.yaml' in files:
+            del dirs[:]
+            continue
+        dirs.sort()
+        for fname in sorted(files):
+            fpath = os.path.join(dirpath, fname)
+            digest.update(os.path.relpath(fpath, root).encode('utf-8'))
+            digest.update(b'\0')
+            with open(fpath, 'rb') as fh:
+                for chunk in iter(lambda: fh.read(1024 * 1024), b''):
+                    digest.update(chunk)
+            digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def config_digest(config):
+    """
+    Return a digest of the configuration values which influence rendering.
+
+    """
+    digest = hashlib.sha256()
+    # Pickles are neither portable between Python versions, nor are the
+    # rendered objects between conda-build versions.
+    digest.update(repr((sys.version_info[:2],
+                        getattr(conda_build, '__version__', None))).encode('utf-8'))
+    for attr in CONFIG_KEY_ATTRIBUTES:
+        value = getattr(config, attr, None)
+        if attr == 'subdir' and value is None:
+            value = subdir
+        if isinstance(value, dict):
+            value = sorted(value.items())
+        digest.update(repr((attr, value)).encode('utf-8'))
+    return digest.hexdigest()
+
+
+class RenderCache(object):
+    """
+    A directory of pickled, rendered metadata keyed by recipe content.
+
+    Parameters
+    ----------
+    directory : str
+        The directory in which to store the cache entries. It will be
+        created if it doesn't already exist.
+    max_size : int
+        The maximum total size, in bytes, of the cache entries. The least
+        recently used entries are evicted beyond this size.
+
+    """
+    def __init__(self, directory, max_size=100 * 1024 * 1024):
+        self.directory = directory
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+
+    @classmethod
+    def from_config(cls, config, **kwargs):
+        """Create a RenderCache in the conda-build root of the given config."""
+        directory = os.path.join(config.croot, 'conda-build-all', 'render-cache')
+        return cls(directory, **kwargs)
+
+    def __repr__(self):
+        return '<RenderCache {!r}: {} hits, {} misses>'.format(
+            self.directory, self.hits, self.misses)
+
+    def key(self, recipe_dir, config):
+        # The rendered metadata refers to the recipe directory (meta.path),
+        # so copies of a recipe in different places don't share an entry.
+        return hashlib.sha256('{}-{}-{}'.format(os.path.abspath(recipe_dir),
+                                                recipe_digest(recipe_dir),
+                                                config_digest(config)
+                                                ).encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + '.pkl')
+
+    def get(self, key, config=None):
+        """
+        Return the list of metas for the given key, or None if the key is
+        not in the cache.
+
+        If a config is given, the metas are re-attached to (a copy of) it,
+        in place of the config which was in use when they were cached.
+
+        """
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as fh:
+                metas = pickle.load(fh)
+        except (IOError, OSError):
+            self.misses += 1
+            return None
+        except Exception as err:
+            # A corrupt or incompatible entry - get rid of it.
+            log.warning('Discarding unreadable render cache entry {} ({})'
+                        ''.format(path, err))
+            self._remove(path)
+            self.misses += 1
+            return None
+        self.hits += 1
+        # Mark the entry as recently used, for the purposes of eviction.
+        os.utime(path, None)
+        if config is not None:
+            for meta in metas:
+                _rebind_config(meta, config)
+        return metas
+
+    def put(self, key, metas):
+        """Store the list of metas under the given key."""
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as fh:
+                pickle.dump(metas, fh, protocol=pickle.HIGHEST_PROTOCOL)
+            path = self._path(key)
+            self._remove(path)
+            os.rename(tmp_path, path)
+        except Exception as err:
+            # Failing to cache is never fatal.
+            log.warning('Unable to write render cache entry ({})'.format(err))
+            self._remove(tmp_path)
+
+    def evict(self):
+        """
+        Remove the least recently used entries until the cache is no larger
+        than ``max_size``.
+
+        """
+        entries = []
+        for fname in os.listdir(self.directory):
+            if not fname.endswith('.pkl'):
+                continue
+            path = os.path.join(self.directory, fname)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_size:
+                break
+            self._remove(path)
+            total -= size
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def _rebind_config(meta, config):
+    # The config of a cached meta is the one from the run that rendered it.
+    # Swap in the current config, keeping hold of the variant that the meta
+    # was rendered for.
+    if not hasattr(meta, 'config'):
+        return
+    cached = meta.config
+    if hasattr(config, 'copy'):
+        new_config = config.copy()
+    else:
+        new_config = deepcopy(config)
+    for attr in ('variant', 'variants', 'input_variants'):
+        if hasattr(cached, attr):
+            setattr(new_config, attr, getattr(cached, attr))
+    meta.config = new_config
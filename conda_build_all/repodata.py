@@ -0,0 +1,241 @@
+"""
+A conditional, cached fetch of the repodata of channels.
+
+Determining which artefacts already exist on the inspection channels only
+needs the filenames in each channel's repodata, so rather than fetching and
+parsing the full repodata on every run, a compact snapshot (the filenames)
+is kept on disk along with the ETag and Last-Modified headers of the
+response. Subsequent fetches are conditional, and the snapshot is re-used
+when the server responds with "304 Not Modified".
+
+"""
+from __future__ import division
+
+import hashlib
+import json
+import logging
+from multiprocessing.pool import ThreadPool
+import os
+import tempfile
+import threading
+import time
+
+from .conda_interface import CondaSession
+
+
+log = logging.getLogger(__name__)
+
+
+class ChannelSnapshot(object):
+    """
+    The artefact filenames in the repodata of a channel (platform) URL.
+
+    Attributes
+    ----------
+    url : str
+        The URL of the channel, including the platform subdirectory.
+    fnames : frozenset
+        The artefact filenames in the channel's repodata.
+    n_bytes : int
+        The number of bytes transferred to get the snapshot.
+    parse_time : float
+        The number of seconds spent parsing the repodata (zero when the
+        snapshot came from the cache).
+    from_cache : bool
+        Whether the snapshot was re-used from the cache.
+    wall_time : float
+        The number of seconds taken to fetch (and parse) the snapshot.
+
+    """
+    def __init__(self, url, fnames, n_bytes=0, parse_time=0.0, from_cache=False):
+        self.url = url
+        self.fnames = frozenset(fnames)
+        self.n_bytes = n_bytes
+        self.parse_time = parse_time
+        self.from_cache = from_cache
+        self.wall_time = 0.0
+
+    def __repr__(self):
+        return '<ChannelSnapshot {!r}: {} artefacts>'.format(self.url, len(self.fnames))
+
+
+def parse_repodata(content):
+    """Return the set of artefact filenames in the given repodata.json content."""
+    if isinstance(content, bytes):
+        content = content.decode('utf-8')
+    repodata = json.loads(content)
+    fnames = set()
+    for key in ('packages', 'packages.conda'):
+        fnames.update(repodata.get(key, {}))
+    return fnames
+
+
+class RepodataCache(object):
+    """
+    Fetches the repodata of channels, re-using the snapshot from a previous
+    fetch when the repodata hasn't changed.
+
+    Parameters
+    ----------
+    directory : str
+        The directory in which to keep the snapshots between runs. If not
+        given, snapshots are only kept by this instance.
+    timeout : float
+        The timeout, in seconds, of each request.
+    jobs : int
+        The maximum number of channels to fetch concurrently in
+        :meth:`fetch_all`.
+
+    """
+    def __init__(self, directory=None, timeout=60, jobs=8):
+        self.directory = directory
+        self.timeout = timeout
+        self.jobs = jobs
+        # url -> snapshot entry (a dict, as stored on disk).
+        self._entries = {}
+        # Sessions aren't safe to share between threads.
+        self._local = threading.local()
+
+    @classmethod
+    def from_config(cls, config, **kwargs):
+        """Create a RepodataCache in the conda-build root of the given config."""
+        directory = os.path.join(config.croot, 'conda-build-all', 'repodata-cache')
+        return cls(directory, **kwargs)
+
+    def __repr__(self):
+        return '<RepodataCache {!r}>'.format(self.directory)
+
+    @property
+    def session(self):
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = self._local.session = CondaSession()
+        return session
+
+    def fetch_all(self, urls):
+        """
+        Return the :class:`ChannelSnapshot` of each of the given URLs, in the
+        same order. Up to ``jobs`` channels are fetched (and parsed) at once.
+
+        """
+        urls = [url.rstrip('/') for url in urls]
+        # Duplicates would race on the same cache entry.
+        unique_urls = sorted(set(urls), key=urls.index)
+        jobs = min(self.jobs, len(unique_urls))
+        if jobs <= 1:
+            snapshots = [self.fetch(url) for url in unique_urls]
+        else:
+            pool = ThreadPool(jobs)
+            try:
+                snapshots = pool.map(self.fetch, unique_urls)
+            finally:
+                pool.terminate()
+        by_url = dict(zip(unique_urls, snapshots))
+        return [by_url[url] for url in urls]
+
+    def fetch(self, url):
+        """
+        Return the :class:`ChannelSnapshot` of the given channel (platform)
+        URL, e.g. ``https://conda.anaconda.org/conda-forge/linux-64``.
+
+        """
+        start = time.time()
+        url = url.rstrip('/')
+        entry = self._entries.get(url)
+        if entry is None:
+            entry = self._load(url)
+        if url.startswith('file://'):
+            snapshot, entry = self._fetch_file(url, entry)
+        else:
+            snapshot, entry = self._fetch_http(url, entry)
+        if not snapshot.from_cache:
+            self._store(url, entry)
+        self._entries[url] = entry
+        snapshot.wall_time = time.time() - start
+        log.info('{}: {} bytes transferred, {:.3f}s parsing, {:.3f}s in total '
+                 '({})'.format(url, snapshot.n_bytes, snapshot.parse_time,
+                               snapshot.wall_time,
+                               'unchanged' if snapshot.from_cache else 'updated'))
+        return snapshot
+
+    def _fetch_http(self, url, entry):
+        headers = {}
+        if entry is not None:
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+        response = self.session.get(url + '/repodata.json', headers=headers,
+                                    timeout=self.timeout)
+        if response.status_code == 304 and entry is not None:
+            return ChannelSnapshot(url, entry['fnames'], from_cache=True), entry
+        if response.status_code == 404:
+            # Typically a channel without a noarch subdirectory.
+            log.warning('No repodata found at {}'.format(url))
+            return ChannelSnapshot(url, [], from_cache=True), entry or {'url': url, 'fnames': []}
+        response.raise_for_status()
+        start = time.time()
+        fnames = parse_repodata(response.content)
+        parse_time = time.time() - start
+        entry = {'url': url, 'etag': response.headers.get('ETag'),
+                 'last_modified': response.headers.get('Last-Modified'),
+                 'fnames': sorted(fnames)}
+        return ChannelSnapshot(url, fnames, len(response.content), parse_time), entry
+
+    def _fetch_file(self, url, entry):
+        # A local channel: the modification time of its repodata takes the
+        # place of the Last-Modified header.
+        path = url[len('file://'):] + '/repodata.json'
+        if os.name == 'nt' and path.startswith('/'):
+            path = path[1:]
+        try:
+            mtime = os.stat(path).st_mtime
+        except OSError:
+            # Like an empty channel, as conda would treat it.
+            return ChannelSnapshot(url, [], from_cache=True), entry or {'url': url, 'fnames': []}
+        if entry is not None and entry.get('mtime') == mtime:
+            return ChannelSnapshot(url, entry['fnames'], from_cache=True), entry
+        with open(path, 'rb') as fh:
+            content = fh.read()
+        start = time.time()
+        fnames = parse_repodata(content)
+        parse_time = time.time() - start
+        entry = {'url': url, 'mtime': mtime, 'fnames': sorted(fnames)}
+        return ChannelSnapshot(url, fnames, len(content), parse_time), entry
+
+    def _path(self, url):
+        key = hashlib.sha1(url.encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, key + '.json')
+
+    def _load(self, url):
+        if self.directory is None:
+            return None
+        try:
+            with open(self._path(url)) as fh:
+                entry = json.load(fh)
+        except (IOError, OSError, ValueError):
+            return None
+        if entry.get('url') != url:
+            return None
+        return entry
+
+    def _store(self, url, entry):
+        if self.directory is None:
+            return
+        tmp_path = None
+        try:
+            if not os.path.isdir(self.directory):
+                os.makedirs(self.directory)
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            with os.fdopen(fd, 'w') as fh:
+                json.dump(entry, fh)
+            path = self._path(url)
+            if os.path.exists(path):
+                os.remove(path)
+            os.rename(tmp_path, path)
+        except (IOError, OSError) as err:
+            # Failing to cache is never fatal.
+            log.warning('Unable to write the repodata snapshot of {} ({})'
+                        ''.format(url, err))
+            if tmp_path is not None and os.path.exists(tmp_path):
+                os.remove(tmp_path)
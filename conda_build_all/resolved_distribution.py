@@ -1,5 +1,8 @@
 from __future__ import print_function
 
+from copy import deepcopy
+import functools
+
 from .conda_interface import get_index
 import conda_build.config
 
@@ -27,6 +30,7 @@ class ResolvedDistribution(object):
     def __init__(self, meta, special_versions=()):
         self.meta = meta
         self.special_versions = special_versions
+        self._resolved_meta = None
 
     def __repr__(self):
         return 'BakedDistribution({}, {})'.format(self.meta,
@@ -38,48 +42,80 @@ class ResolvedDistribution(object):
     def vn_context(self, config=None):
         return setup_vn_mtx_case(self.special_versions, config)
 
+    @property
+    def resolved_meta(self):
+        """
+        A copy of the meta, parsed with the special versions of this
+        distribution. It is parsed on first access and then cached, see
+        :meth:`invalidate`.
+
+        """
+        if self._resolved_meta is None:
+            meta = deepcopy(self.meta)
+            if hasattr(meta, 'config'):
+                config = setup_vn_mtx_case(self.special_versions,
+                                           config=meta.config)
+                meta.parse_again(config)
+            else:
+                with setup_vn_mtx_case(self.special_versions):
+                    meta.parse_again()
+            self._resolved_meta = meta
+        return self._resolved_meta
+
+    def invalidate(self):
+        """
+        Discard the cached resolved meta, such that it is parsed again on
+        next access. Necessary if the meta (or its config) is changed.
+
+        """
+        self._resolved_meta = None
+
     def __getattr__(self, name):
-        if hasattr(self.meta, 'config'):
-            config = setup_vn_mtx_case(self.special_versions,
-                                       config=self.meta.config)
-            self.meta.parse_again(config)
-        else:
-            with setup_vn_mtx_case(self.special_versions):
-                self.meta.parse_again()
-        result = getattr(self.meta, name)
-
-        # Wrap any callable such that it is called within the appropriate
-        # environment.
+        # Don't delegate special (e.g. pickle protocol) attributes, nor our
+        # own attributes before they are set (e.g. whilst unpickling).
+        if name.startswith('__') or name in ('meta', 'special_versions',
+                                             '_resolved_meta'):
+            raise AttributeError(name)
+        result = getattr(self.resolved_meta, name)
+
+        # Without a config on the meta, conda-build reads the special versions
+        # from the global config, so wrap any callable such that it is called
+        # within the appropriate environment.
         # callable exists in python 2.* and >=3.2
-        if callable(result):
+        if callable(result) and not hasattr(self.meta, 'config'):
             orig_result = result
-            import functools
             @functools.wraps(result)
             def with_vn_mtx_setup(*args, **kwargs):
-                if hasattr(self.meta, 'config'):
-                    config = setup_vn_mtx_case(self.special_versions,
-                                               config=self.meta.config)
-                    self.meta.parse_again(config=config)
+                with setup_vn_mtx_case(self.special_versions):
                     return orig_result(*args, **kwargs)
-                else:
-                    with setup_vn_mtx_case(self.special_versions):
-                        self.meta.parse_again()
-                        return orig_result(*args, **kwargs)
             result = with_vn_mtx_setup
         return result
 
     @classmethod
-    def resolve_all(cls, meta, index=None, extra_conditions=None):
+    def resolve_all(cls, meta, index=None, extra_conditions=None,
+                    solve_cache=None, resolver=None, assume_solvable=False):
         """
         Given a package, return a list of ResolvedDistributions, one for each
         possible (necessary) version permutation.
 
+        A :class:`conda_build_all.version_matrix.SolveCache` may be given to
+        share the solver results between packages, and likewise a
+        :class:`conda_build_all.conda_interface.IncrementalResolve` to share
+        the resolver. The extra_conditions may be a compiled
+        :class:`conda_build_all.version_matrix.MatrixConditions`.
+
+        If ``assume_solvable`` is True, the distributions for all of the
+        candidate cases are returned, without checking that they can be
+        solved.
+
         """
-        if index is None:
+        if index is None and resolver is None:
             with vn_matrix.override_conda_logging('WARN'):
                 index = get_index()
 
-        cases = sorted(vn_matrix.special_case_version_matrix(meta, index))
+        cases = sorted(vn_matrix.special_case_version_matrix(
+            meta, index, solve_cache=solve_cache, resolver=resolver,
+            assume_solvable=assume_solvable))
 
         if extra_conditions:
             cases = list(vn_matrix.filter_cases(cases, extra_conditions))
@@ -1,10 +1,16 @@
 from contextlib import contextmanager
+import copy
 import os
 import re
 import shutil
 import tempfile
 import textwrap
+import time
 import unittest
+try:
+    from unittest import mock
+except ImportError:
+    import mock
 
 try:
     import conda_build.api
@@ -12,10 +18,10 @@ except ImportError:
     import conda_build.config
 
 from conda_build.metadata import MetaData
-from conda_build_all.conda_interface import string_types
+from conda_build_all.conda_interface import string_types, IncrementalResolve
 
 from conda_build_all.resolved_distribution import ResolvedDistribution
-from conda_build_all.builder import Builder
+from conda_build_all.builder import Builder, ExistingArtefacts
 from conda_build_all.tests.unit.dummy_index import DummyIndex
 
 
@@ -187,10 +193,19 @@ class Test__find_existing_built_dists(RecipeCreatingUnit):
         dists = [(meta.dist(), locn) for meta, locn in existing]
         self.assertEqual(dists, [('a-1.0-0', distribution_directory), ('a-2.0-0', None)])
 
+    def test_conda_format_exists_in_directory(self):
+        distribution_directory = self.tmp_dir()
+        with open(os.path.join(distribution_directory, self.metas['a2'].dist() + '.conda'), 'w') as fh:
+            fh.write('placeholder')
+        builder = Builder('.', [], [distribution_directory], [], [])
+        existing = builder.find_existing_built_dists([self.metas['a1'], self.metas['a2']])
+        dists = [(meta.dist(), locn) for meta, locn in existing]
+        self.assertEqual(dists, [('a-1.0-0', None), ('a-2.0-0', distribution_directory)])
+
 
 class Test_compute_build_distros(RecipeCreatingUnit):
-    def test_added_to_index(self):
-        metas = [self.write_meta('py2k', """
+    def write_metas(self):
+        return [self.write_meta('py2k', """
                     package:
                         name: python
                         version: 2.7.0
@@ -233,22 +248,215 @@ class Test_compute_build_distros(RecipeCreatingUnit):
                             - python
                             - numpy
                     """)]
-        builder = Builder(None, None, None, None, None)
-        index = {}
+
+    def config(self):
+        # A conda-build root of its own, so that the persistent solve cache
+        # doesn't carry state between tests (or runs).
+        croot = self.tmp_dir(prefix='croot')
         if hasattr(conda_build, 'api'):
-            config = conda_build.api.Config()
+            return conda_build.api.Config(croot=croot)
         else:
-            config = conda_build.config.config
-        distributions = builder.compute_build_distros(index, metas, config)
-        expected = ['python-2.7.0-0', 'python-3.3.0-0', 'python-3.4.24-0',
-                    'python-3.5.2-1',
-                    'numpy-1.10-py27_0', 'numpy-1.10-py34_0', 'numpy-1.10-py35_0',
-                    'my_py_package-2.0-py27_0', 'my_py_package-2.0-py34_0',
-                    'my_py_package-2.0-py35_0']
-        self.assertEqual([meta.dist() for meta in distributions], expected)
+            config = copy.copy(conda_build.config.config)
+            config.croot = croot
+            return config
+
+    expected = ['python-2.7.0-0', 'python-3.3.0-0', 'python-3.4.24-0',
+                'python-3.5.2-1',
+                'numpy-1.10-py27_0', 'numpy-1.10-py34_0', 'numpy-1.10-py35_0',
+                'my_py_package-2.0-py27_0', 'my_py_package-2.0-py34_0',
+                'my_py_package-2.0-py35_0']
+
+    def test_added_to_index(self):
+        metas = self.write_metas()
+        builder = Builder(None, None, None, None, None)
+        index = {}
+        distributions = builder.compute_build_distros(index, metas, self.config())
+        self.assertEqual([meta.dist() for meta in distributions], self.expected)
         # Check that we didn't change the index.
         self.assertEqual(index, {})
 
+    def test_matrix_jobs(self):
+        # The recipes are all resolved in a single wave of workers (there are
+        # no recipe dependencies), so those which depend on distributions
+        # planned by the others must be resolved again to give the same result.
+        metas = self.write_metas()
+        builder = Builder(None, None, None, None, None, matrix_jobs=2)
+        index = {}
+        distributions = builder.compute_build_distros(index, metas, self.config())
+        self.assertEqual([meta.dist() for meta in distributions], self.expected)
+        self.assertEqual(index, {})
+
+    def test_existing_artefacts(self):
+        metas = self.write_metas()
+        builder = Builder(None, None, None, None, None, solve_cache=False)
+        existing = ExistingArtefacts({dist + '.tar.bz2': 'a_channel'
+                                      for dist in self.expected})
+        with mock.patch.object(IncrementalResolve, 'solve_pruned') as solve:
+            distributions = builder.compute_build_distros({}, metas, self.config(),
+                                                          existing=existing)
+        self.assertEqual([meta.dist() for meta in distributions], self.expected)
+        self.assertEqual(solve.call_count, 0)
+
+    def test_some_existing_artefacts(self):
+        # The matrix of my_py_package must be solved, as one of its
+        # artefacts doesn't exist. The plan is the same.
+        metas = self.write_metas()
+        builder = Builder(None, None, None, None, None, solve_cache=False)
+        existing = ExistingArtefacts({dist + '.tar.bz2': 'a_channel'
+                                      for dist in self.expected[:-1]})
+        distributions = builder.compute_build_distros({}, metas, self.config(),
+                                                      existing=existing)
+        self.assertEqual([meta.dist() for meta in distributions], self.expected)
+
+
+class FakeBuildUnit(RecipeCreatingUnit):
+    # The builds are faked: each writes an artefact, and a log of when it
+    # started and finished, after a short sleep.
+    def setUp(self):
+        super(FakeBuildUnit, self).setUp()
+        self.croot = self.tmp_dir(prefix='croot')
+        self.log_dir = self.tmp_dir(prefix='build_log')
+        # The build time of each package, if not the default.
+        self.durations = {}
+
+    def fake_build(self, meta, config):
+        with open(os.path.join(self.log_dir, meta.name()), 'w') as fh:
+            fh.write('{!r}\n'.format(time.time()))
+            time.sleep(self.durations.get(meta.name(), 0.5))
+            fh.write('{!r}\n'.format(time.time()))
+        subdir_dir = os.path.join(config.croot, 'linux-64')
+        if not os.path.isdir(subdir_dir):
+            os.makedirs(subdir_dir)
+        path = os.path.join(subdir_dir, '{}.tar.bz2'.format(meta.dist()))
+        open(path, 'w').close()
+        return [path]
+
+    def fake_meta(self, name):
+        meta = mock.Mock(resolved_meta=None)
+        meta.name.return_value = name
+        meta.dist.return_value = '{}-1.0-0'.format(name)
+        return meta
+
+    def build_times(self, name):
+        with open(os.path.join(self.log_dir, name)) as fh:
+            return [float(line) for line in fh]
+
+    def slow_delivery(self, meta, built_dist_location, was_built, config=None):
+        time.sleep(0.3)
+        if meta.name() == 'bad':
+            raise ValueError('Upload failed')
+
+
+class Test_build_concurrently(FakeBuildUnit):
+    def test_dependency_order(self):
+        builder = Builder(None, [], [], [], [], jobs=2)
+        builder.recipe_dependencies = {'a': [], 'b': ['a'], 'c': []}
+        recipes = [[self.fake_meta(name), None] for name in ['a', 'b', 'c']]
+        config = mock.Mock(croot=self.croot, channel_urls=())
+        with mock.patch.object(Builder, 'build', side_effect=self.fake_build):
+            with mock.patch('conda_build.api.update_index'):
+                builder.build_concurrently(recipes, config)
+        a_start, a_end = self.build_times('a')
+        b_start, b_end = self.build_times('b')
+        c_start, c_end = self.build_times('c')
+        # b depends on a, so only starts once a has finished, whereas c
+        # is built alongside a.
+        self.assertGreaterEqual(b_start, a_end)
+        self.assertLess(c_start, a_end)
+        self.assertEqual(sorted(os.listdir(os.path.join(self.croot, 'linux-64'))),
+                         ['a-1.0-0.tar.bz2', 'b-1.0-0.tar.bz2', 'c-1.0-0.tar.bz2'])
+
+    def test_build_process_dies(self):
+        builder = Builder(None, [], [], [], [], jobs=2)
+        recipes = [[self.fake_meta('a'), None]]
+        config = mock.Mock(croot=self.croot, channel_urls=())
+        with mock.patch.object(Builder, 'build', side_effect=lambda meta, config: os._exit(3)):
+            with self.assertRaises(RuntimeError) as cm:
+                builder.build_concurrently(recipes, config)
+        self.assertIn('exited with code 3', str(cm.exception))
+
+    def test_build_system_exit(self):
+        builder = Builder(None, [], [], [], [], jobs=2)
+        recipes = [[self.fake_meta('a'), None]]
+        config = mock.Mock(croot=self.croot, channel_urls=())
+        with mock.patch.object(Builder, 'build', side_effect=SystemExit('Missing dependency')):
+            with self.assertRaises(RuntimeError) as cm:
+                builder.build_concurrently(recipes, config)
+        self.assertIn('Missing dependency', str(cm.exception))
+
+    def test_woken_by_delivery(self):
+        # b waits for the delivery of a, but not for c to finish building.
+        builder = Builder(None, [], [], [], [], jobs=2, delivery_queue=2)
+        builder.recipe_dependencies = {'a': [], 'b': ['a'], 'c': []}
+        self.durations = {'a': 0.1, 'c': 2}
+        recipes = [[self.fake_meta(name), None] for name in ['a', 'c', 'b']]
+        config = mock.Mock(croot=self.croot, channel_urls=())
+        with mock.patch.object(Builder, 'build', side_effect=self.fake_build):
+            with mock.patch.object(Builder, 'post_build', side_effect=self.slow_delivery):
+                with mock.patch('conda_build.api.update_index'):
+                    builder.build_concurrently(recipes, config)
+        a_start, a_end = self.build_times('a')
+        b_start, b_end = self.build_times('b')
+        c_start, c_end = self.build_times('c')
+        self.assertGreaterEqual(b_start, a_end + 0.3)
+        self.assertLess(b_start, c_end)
+
+    def test_failed_delivery(self):
+        # The dependents of a failed delivery aren't built.
+        builder = Builder(None, [], [], [], [], jobs=2, delivery_queue=2)
+        builder.recipe_dependencies = {'bad': [], 'b': ['bad'], 'c': ['b'], 'd': []}
+        recipes = [[self.fake_meta(name), None] for name in ['bad', 'b', 'c', 'd']]
+        config = mock.Mock(croot=self.croot, channel_urls=())
+        with mock.patch.object(Builder, 'build', side_effect=self.fake_build):
+            with mock.patch.object(Builder, 'post_build', side_effect=self.slow_delivery):
+                with mock.patch('conda_build.api.update_index'):
+                    with self.assertRaises(RuntimeError) as cm:
+                        builder.build_concurrently(recipes, config)
+        self.assertIn('Upload failed', str(cm.exception))
+        self.assertEqual(sorted(os.listdir(self.log_dir)), ['bad', 'd'])
+
+    def test_existing_deliveries_dont_hold_up_builds(self):
+        builder = Builder(None, [], [], [], [], jobs=2, delivery_queue=1)
+        recipes = [[self.fake_meta(name), '{}.tar.bz2'.format(name)]
+                   for name in ['x', 'y', 'z']]
+        recipes.append([self.fake_meta('a'), None])
+        config = mock.Mock(croot=self.croot, channel_urls=())
+        start = time.time()
+        with mock.patch.object(Builder, 'build', side_effect=self.fake_build):
+            with mock.patch.object(Builder, 'post_build', side_effect=self.slow_delivery) as post_build:
+                with mock.patch('conda_build.api.update_index'):
+                    builder.build_concurrently(recipes, config)
+        a_start, a_end = self.build_times('a')
+        self.assertLess(a_start, start + 0.3)
+        self.assertEqual(post_build.call_count, 4)
+
+    def test_build_error_not_replaced(self):
+        # The delivery of bad fails, but the error raised is that of the build.
+        builder = Builder(None, [], [], [], [], jobs=2, delivery_queue=1)
+        recipes = [[self.fake_meta('bad'), 'bad.tar.bz2'], [self.fake_meta('a'), None]]
+        config = mock.Mock(croot=self.croot, channel_urls=())
+        with mock.patch.object(Builder, 'build', side_effect=SystemExit('Missing dependency')):
+            with mock.patch.object(Builder, 'post_build', side_effect=self.slow_delivery):
+                with mock.patch('conda_build_all.builder.log') as log:
+                    with self.assertRaises(RuntimeError) as cm:
+                        builder.build_concurrently(recipes, config)
+        self.assertIn('Building a-1.0-0 failed', str(cm.exception))
+        self.assertEqual(log.exception.call_count, 1)
+
+
+class Test_build_serially(FakeBuildUnit):
+    def test_failed_delivery(self):
+        builder = Builder(None, [], [], [], [], delivery_queue=2)
+        builder.recipe_dependencies = {'bad': [], 'b': ['bad'], 'c': ['b'], 'd': []}
+        recipes = [[self.fake_meta(name), None] for name in ['bad', 'b', 'c', 'd']]
+        config = mock.Mock(croot=self.croot, channel_urls=())
+        with mock.patch.object(Builder, 'build', side_effect=self.fake_build):
+            with mock.patch.object(Builder, 'post_build', side_effect=self.slow_delivery):
+                with self.assertRaises(RuntimeError) as cm:
+                    builder.build_serially(recipes, config)
+        self.assertIn('Upload failed', str(cm.exception))
+        self.assertEqual(sorted(os.listdir(self.log_dir)), ['bad', 'd'])
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -38,10 +38,15 @@ class Test_AnacondaClientChannelDest(unittest.TestCase):
 
     @contextmanager
     def dist_exists_setup(self, on_owner, on_channel):
-        dist_exists = mock.patch('conda_build_all.inspect_binstar.distribution_exists', return_value=on_owner)
-        dist_exists_on_channel = mock.patch('conda_build_all.inspect_binstar.distribution_exists_on_channel', return_value=on_channel)
+        dist_exists = mock.patch('conda_build_all.inspect_binstar.OwnerInventory.distribution_exists',
+                                 return_value=on_owner)
+        # The channel listing is only fetched once per destination, so each
+        # call gets its own set.
+        on_channel_fnames = ['a-0.0-0.tar.bz2'] if on_channel else []
+        channel_dists = mock.patch('conda_build_all.inspect_binstar.channel_distributions',
+                                   side_effect=lambda *args, **kwargs: set(on_channel_fnames))
         with dist_exists:
-            with dist_exists_on_channel:
+            with channel_dists:
                 yield
 
     def test_not_already_available_not_just_built(self):
@@ -70,7 +75,8 @@ class Test_AnacondaClientChannelDest(unittest.TestCase):
                 ad.make_available(meta, mock.sentinel.dist_path,
                                   just_built=True, config=config)
         upload.assert_called_once_with(client, meta, owner,
-                                       channels=[channel], config=config)
+                                       channels=[channel], config=config,
+                                       inventory=ad.inventory)
         self.logger.info.assert_called_once_with('Uploading a to the sentinel.channel channel.')
 
     def test_already_available_not_just_built(self):
@@ -105,8 +111,6 @@ class Test_AnacondaClientChannelDest(unittest.TestCase):
     def test_already_available_elsewhere(self):
         client, owner, channel = [mock.sentinel.client, mock.sentinel.owner,
                                   mock.sentinel.channel]
-        ad = AnacondaClientChannelDest(mock.sentinel.token, owner, channel)
-        ad._cli = client
         meta = DummyPackage('a', '2.1.0')
         config = self._get_config()
         source_owner = 'fake_owner'
@@ -114,12 +118,67 @@ class Test_AnacondaClientChannelDest(unittest.TestCase):
         for url in ['http://foo.bar/{}/osx-64/'.format(source_owner),
                     'https://foo.bar/wibble/{}/osx-64/'.format(source_owner),
                     'https://foo.bar/wibble/{}/osx-64'.format(source_owner)]:
+            # A destination remembers what it has made available, so each
+            # URL needs a fresh one.
+            ad = AnacondaClientChannelDest(mock.sentinel.token, owner, channel)
+            ad._cli = client
             with self.dist_exists_setup(on_owner=False, on_channel=False):
                 with mock.patch('conda_build_all.inspect_binstar.copy_distribution_to_owner') as copy:
                     ad.make_available(meta, url, just_built=False,
                                       config=config)
             copy.assert_called_once_with(ad._cli, source_owner, owner, meta, channel=channel)
 
+    def test_channel_listed_once(self):
+        client, owner, channel = [mock.sentinel.client, mock.sentinel.owner,
+                                  mock.sentinel.channel]
+        ad = AnacondaClientChannelDest(mock.sentinel.token, owner, channel)
+        ad._cli = client
+        meta = DummyPackage('a', '2.1.0')
+        config = self._get_config()
+        with self.dist_exists_setup(on_owner=False, on_channel=False):
+            with mock.patch('conda_build_all.build.upload') as upload:
+                ad.make_available(meta, mock.sentinel.dist_path,
+                                  just_built=True, config=config)
+                # The upload is reflected in the listing, so the second
+                # time around there is nothing to be done.
+                ad.make_available(meta, mock.sentinel.dist_path,
+                                  just_built=False, config=config)
+            channel_dists = conda_build_all.inspect_binstar.channel_distributions
+            channel_dists.assert_called_once_with(owner, channel, repodata_cache=None)
+        self.assertEqual(upload.call_count, 1)
+        self.assertEqual(ad.channel_distributions, {'a-0.0-0.tar.bz2'})
+        self.logger.info.assert_called_with('Nothing to be done for a - it is already on sentinel.owner/sentinel.channel.')
+
+    def test_background_uploads(self):
+        client, owner, channel = [mock.sentinel.client, mock.sentinel.owner,
+                                  mock.sentinel.channel]
+        ad = AnacondaClientChannelDest(mock.sentinel.token, owner, channel,
+                                       upload_jobs=2)
+        ad._cli = client
+        metas = [DummyPackage(name) for name in ['a', 'b', 'c']]
+        config = self._get_config()
+
+        def upload(cli, meta, *args, **kwargs):
+            if meta.name() == 'b':
+                raise ValueError('Connection reset')
+
+        with self.dist_exists_setup(on_owner=False, on_channel=False):
+            with mock.patch('conda_build_all.build.upload', side_effect=upload) as upload:
+                with mock.patch('binstar_client.utils.get_binstar') as get_binstar:
+                    for meta in metas:
+                        ad.make_available(meta, mock.sentinel.dist_path,
+                                          just_built=True, config=config)
+                    with self.assertRaises(RuntimeError) as cm:
+                        ad.flush()
+        self.assertEqual(upload.call_count, 3)
+        # The uploads use the clients of the upload threads.
+        self.assertNotIn(client, [call[0][0] for call in upload.call_args_list])
+        self.assertLessEqual(get_binstar.call_count, 2)
+        self.assertIn('b-0.0-0: Connection reset', str(cm.exception))
+        self.assertEqual(ad.channel_distributions, {'a-0.0-0.tar.bz2', 'c-0.0-0.tar.bz2'})
+        # The failures are only reported once.
+        ad.flush()
+
     def test_from_spec_owner(self):
         spec = 'testing'
         os.environ['BINSTAR_TOKEN'] = 'a test token'
@@ -127,14 +186,16 @@ class Test_AnacondaClientChannelDest(unittest.TestCase):
         self.assertEqual(dest.token, 'a test token')
         self.assertEqual(dest.owner, 'testing')
         self.assertEqual(dest.channel, 'main')
+        self.assertEqual(dest.upload_jobs, 0)
 
     def test_from_spec_owner_and_channel(self):
         spec = 'testing_owner/channels/my_channel'
         os.environ['BINSTAR_TOKEN'] = 'a test token'
-        dest = AnacondaClientChannelDest.from_spec(spec)
+        dest = AnacondaClientChannelDest.from_spec(spec, upload_jobs=4)
         self.assertEqual(dest.token, 'a test token')
         self.assertEqual(dest.owner, 'testing_owner')
         self.assertEqual(dest.channel, 'my_channel')
+        self.assertEqual(dest.upload_jobs, 4)
 
 
 class Test_DirectoryDestination(unittest.TestCase):
@@ -0,0 +1,128 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+import binstar_client
+
+from conda_build_all.build import file_checksums, same_checksums, upload
+from conda_build_all.inspect_binstar import OwnerInventory
+from conda_build_all.tests.unit.dummy_index import DummyPackage
+
+
+class Test_upload(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp(prefix='upload')
+        self.fname = os.path.join(self.tmp_dir, 'a-1.0-0.tar.bz2')
+        self.content = b'distribution' * 100000
+        with open(self.fname, 'wb') as fh:
+            fh.write(self.content)
+        self.md5 = hashlib.md5(self.content).hexdigest()
+        self.sha256 = hashlib.sha256(self.content).hexdigest()
+        self.basename = 'linux-64/a-1.0-0.tar.bz2'
+        attrs = ({'name': 'a', 'summary': ''}, {'version': '1.0'},
+                 {'basename': self.basename, 'attrs': {}})
+        self.patches = [mock.patch('conda_build_all.build.get_output_file_path',
+                                   return_value=self.fname),
+                        mock.patch('conda_build_all.build.detect_package_type',
+                                   return_value='conda'),
+                        mock.patch('conda_build_all.build.get_attrs',
+                                   return_value=attrs)]
+        for patch in self.patches:
+            patch.start()
+        self.cli = mock.Mock()
+        self.cli.upload.return_value = {}
+
+    def tearDown(self):
+        for patch in self.patches:
+            patch.stop()
+        shutil.rmtree(self.tmp_dir)
+
+    def inventory(self, **file_info):
+        file_info.update(basename=self.basename, version='1.0', labels=['main'])
+        self.cli.package.return_value = {'versions': ['1.0'], 'files': [file_info]}
+        return OwnerInventory(self.cli, 'owner')
+
+    def test_checksums(self):
+        self.assertEqual(file_checksums(self.fname, blocksize=1000),
+                         (self.md5, self.sha256))
+        self.assertTrue(same_checksums({'md5': self.md5}, self.md5, self.sha256))
+        self.assertFalse(same_checksums({'md5': self.md5, 'sha256': 'abc'},
+                                        self.md5, self.sha256))
+        self.assertIsNone(same_checksums({}, self.md5, self.sha256))
+
+    def test_identical(self):
+        inventory = self.inventory(md5=self.md5, sha256=self.sha256)
+        upload(self.cli, DummyPackage('a'), 'owner', channels=['main', 'dev'],
+               inventory=inventory)
+        self.assertEqual(self.cli.upload.call_count, 0)
+        self.assertEqual(self.cli.remove_dist.call_count, 0)
+        self.cli.add_channel.assert_called_once_with('dev', 'owner', 'a', '1.0',
+                                                     filename=self.basename)
+        self.assertEqual(inventory.pop_upload_decisions(),
+                         [(self.basename, 'identical')])
+
+    def test_mismatch(self):
+        inventory = self.inventory(md5='0' * 32)
+        upload(self.cli, DummyPackage('a'), 'owner', inventory=inventory)
+        self.cli.remove_dist.assert_called_once_with('owner', 'a', '1.0', self.basename)
+        self.assertEqual(self.cli.upload.call_count, 1)
+        self.assertEqual(inventory.pop_upload_decisions(),
+                         [(self.basename, 'replaced')])
+        # The checksums of the upload are recorded, so uploading again is a no-op.
+        upload(self.cli, DummyPackage('a'), 'owner', inventory=inventory)
+        self.assertEqual(self.cli.upload.call_count, 1)
+        self.assertEqual(inventory.file_info('a', self.basename)['sha256'], self.sha256)
+
+    def test_concurrent_new_package(self):
+        # Two variants of a new package, uploaded at the same time, create
+        # the package and release once.
+        self.cli.package.side_effect = binstar_client.NotFound('a')
+        self.cli.add_package.side_effect = lambda *args, **kwargs: time.sleep(0.1)
+        inventory = OwnerInventory(self.cli, 'owner')
+
+        def attrs(package_type, fname):
+            basename = 'linux-64/' + os.path.basename(fname)
+            return ({'name': 'a', 'summary': ''}, {'version': '1.0'},
+                    {'basename': basename, 'attrs': {}})
+
+        fnames = {}
+        for build in ['py27_0', 'py35_0']:
+            fnames[build] = os.path.join(self.tmp_dir, 'a-1.0-{}.tar.bz2'.format(build))
+            shutil.copy(self.fname, fnames[build])
+        metas = [mock.Mock(build=build) for build in fnames]
+        with mock.patch('conda_build_all.build.get_output_file_path',
+                        side_effect=lambda meta: fnames[meta.build]):
+            with mock.patch('conda_build_all.build.get_attrs', side_effect=attrs):
+                threads = [threading.Thread(target=upload,
+                                            args=(self.cli, meta, 'owner'),
+                                            kwargs={'inventory': inventory})
+                           for meta in metas]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+        self.assertEqual(self.cli.add_package.call_count, 1)
+        self.assertEqual(self.cli.add_release.call_count, 1)
+        self.assertEqual(self.cli.upload.call_count, 2)
+
+    def test_own_client(self):
+        # The inventory's lookups are made with the uploading client, not
+        # the client the inventory was created with.
+        inventory = self.inventory(md5=self.md5, sha256=self.sha256)
+        cli, self.cli = self.cli, mock.Mock()
+        self.cli.package.return_value = cli.package.return_value
+        upload(self.cli, DummyPackage('a'), 'owner', inventory=inventory)
+        self.assertEqual(cli.package.call_count, 0)
+        self.assertEqual(self.cli.package.call_count, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,4 +1,7 @@
+import json
 import os
+import shutil
+import tempfile
 import unittest
 
 try:
@@ -6,7 +9,8 @@ try:
 except ImportError:
     import conda_build.config
 
-from conda_build_all.builder import list_metas
+from conda_build_all.builder import list_metas, named_dependencies, Builder
+from conda_build_all.conda_interface import subdir
 from conda_build_all.tests.integration.test_builder import RecipeCreatingUnit
 
 
@@ -55,6 +59,12 @@ class Test_list_metas(RecipeCreatingUnit):
         names = [meta.name() for meta in metas]
         self.assertEqual(sorted(names), ['m1', 'm2', 'm3', 'm4'])
 
+    def test_jobs(self):
+        serial = list_metas(self.recipes_root_dir)
+        parallel = list_metas(self.recipes_root_dir, jobs=2)
+        self.assertEqual([meta.name() for meta in parallel],
+                         [meta.name() for meta in serial])
+
     def test_follow_symlink(self):
         link_dir = self.tmp_dir(prefix='recipes_through_links')
         os.symlink(os.path.join(self.recipes_root_dir, 'd1'),
@@ -105,6 +115,42 @@ class Test_sort_dependency_order(RecipeCreatingUnit):
         names = [m.name() for m in sort_dependency_order(metas, config)]
         self.assertEqual(names, ['c', 'a', 'b'])
 
+    def test_named_dependencies(self):
+        if hasattr(conda_build, 'api'):
+            config = conda_build.api.Config()
+        else:
+            config = conda_build.config.config
+
+        metas = list_metas(self.recipes_root_dir)
+        self.assertEqual(named_dependencies(metas, config),
+                         {'a': ['c'], 'b': ['a'], 'c': []})
+
+
+class Test_find_existing_artefacts(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix='existing_artefacts')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def channel(self, name, fnames):
+        directory = os.path.join(self.tmpdir, name, subdir)
+        os.makedirs(directory)
+        with open(os.path.join(directory, 'repodata.json'), 'w') as fh:
+            json.dump({'packages': {fname: {} for fname in fnames}}, fh)
+        return 'file://' + os.path.join(self.tmpdir, name).replace(os.path.sep, '/')
+
+    def test_channels(self):
+        first = self.channel('first', ['a-1.0-0.tar.bz2'])
+        second = self.channel('second', ['a-1.0-0.tar.bz2', 'b-1.0-0.tar.bz2'])
+        builder = Builder(None, [first, second], [], [], [])
+        existing = builder.find_existing_artefacts()
+        # The first channel takes precedence.
+        self.assertEqual(existing.location('a-1.0-0.tar.bz2'),
+                         '{}/{}'.format(first, subdir))
+        self.assertEqual(existing.location('b-1.0-0.tar.bz2'),
+                         '{}/{}'.format(second, subdir))
+
  
 if __name__ == '__main__':
     unittest.main()
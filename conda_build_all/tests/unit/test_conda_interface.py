@@ -0,0 +1,142 @@
+import unittest
+
+from conda_build_all.conda_interface import (OverlayIndex, Resolve, copy_index,
+                                             IncrementalResolve)
+from conda_build_all.tests.unit.dummy_index import DummyIndex
+from conda_build_all.version_matrix import NO_PACKAGES_EXCEPTION
+
+
+class Test_OverlayIndex(unittest.TestCase):
+    def setUp(self):
+        self.base = DummyIndex()
+        self.base.add_pkg('python', '2.7.2')
+        self.base.add_pkg('python', '3.5.0')
+        self.base = copy_index(self.base)
+        self.overlay = OverlayIndex(self.base)
+        self.overlay['a-1.0-0.tar.bz2'] = dict(name='a', version='1.0',
+                                               build='0', build_number=0,
+                                               depends=['python'])
+
+    def test_read_through(self):
+        self.assertEqual(self.overlay['python-2.7.2-0.tar.bz2']['version'], '2.7.2')
+        self.assertEqual(self.overlay['a-1.0-0.tar.bz2']['version'], '1.0')
+        self.assertIn('a-1.0-0.tar.bz2', self.overlay)
+        self.assertEqual(len(self.overlay), 3)
+        self.assertEqual(len(list(self.overlay.items())), 3)
+
+    def test_base_unchanged(self):
+        self.assertEqual(len(self.base), 2)
+        with self.assertRaises(KeyError):
+            del self.overlay['python-2.7.2-0.tar.bz2']
+
+    def test_copy(self):
+        index = self.overlay.copy()
+        index['b-1.0-0.tar.bz2'] = dict(name='b', version='1.0', build='0',
+                                        build_number=0, depends=[])
+        self.assertEqual(len(index), 4)
+        self.assertEqual(len(self.overlay), 3)
+
+    def test_by_name(self):
+        by_name = self.overlay.by_name()
+        self.assertEqual(sorted(by_name), ['a', 'python'])
+        self.assertEqual(len(by_name['python']), 2)
+        self.assertEqual(len(OverlayIndex(self.base).by_name()['python']), 2)
+
+    def test_resolve(self):
+        r = Resolve(self.overlay)
+        self.assertTrue(r.solve(['a']))
+
+
+class Test_IncrementalResolve(unittest.TestCase):
+    def setUp(self):
+        index = DummyIndex()
+        index.add_pkg('python', '2.7.2')
+        self.resolver = IncrementalResolve(OverlayIndex(copy_index(index)))
+
+    def test_absorb(self):
+        self.assertTrue(self.resolver.solve(['python']))
+        with self.assertRaises(NO_PACKAGES_EXCEPTION):
+            self.resolver.solve(['a'])
+        self.resolver.add('a-1.0-0.tar.bz2',
+                          dict(name='a', version='1.0', build='0',
+                               build_number=0, depends=['python']))
+        self.assertTrue(self.resolver.solve(['a']))
+        self.assertEqual(self.resolver.n_constructed, 1)
+
+    def test_absorb_features(self):
+        # Records with new features are absorbed just as a new Resolve
+        # would see them.
+        self.assertTrue(self.resolver.solve(['python']))
+        self.resolver.add('debug-1.0-0.tar.bz2',
+                          dict(name='debug', version='1.0', build='0',
+                               build_number=0, depends=[],
+                               track_features='debug'))
+        self.resolver.add('a-1.0-0.tar.bz2',
+                          dict(name='a', version='1.0', build='0',
+                               build_number=0, depends=['python'],
+                               features='debug'))
+        self.resolver.add('a-1.0-1.tar.bz2',
+                          dict(name='a', version='1.0', build='1',
+                               build_number=1, depends=['python']))
+        self.assertEqual(self.resolver.n_constructed, 1)
+        incremental, fresh = self.resolver.resolve, Resolve(self.resolver.index)
+
+        def contents(r):
+            return (set(map(str, r.index)),
+                    {name: set(map(str, keys)) for name, keys in r.groups.items()},
+                    {name: set(map(str, keys)) for name, keys in r.trackers.items()})
+
+        self.assertEqual(contents(incremental), contents(fresh))
+        for specs in [['a'], ['a', 'debug']]:
+            self.assertEqual(sorted(map(str, incremental.solve(specs))),
+                             sorted(map(str, fresh.solve(specs))))
+
+    def test_pruned(self):
+        self.resolver.add('a-1.0-0.tar.bz2',
+                          dict(name='a', version='1.0', build='0',
+                               build_number=0, depends=['python']))
+        self.resolver.add('b-1.0-0.tar.bz2',
+                          dict(name='b', version='1.0', build='0',
+                               build_number=0, depends=[]))
+        pruned = self.resolver.pruned(['a'])
+        self.assertEqual(sorted(info['name'] for info in pruned.index.values()),
+                         ['a', 'python'])
+        self.assertIs(self.resolver.pruned(['a']), pruned)
+        self.assertTrue(self.resolver.solve_pruned(['a']))
+        # A new record which extends the closure invalidates the pruned index.
+        self.resolver.add('a-2.0-0.tar.bz2',
+                          dict(name='a', version='2.0', build='0',
+                               build_number=0, depends=['b']))
+        self.assertEqual(self.resolver.closure(['a']), set(['a', 'b', 'python']))
+        self.assertIsNot(self.resolver.pruned(['a']), pruned)
+
+    def test_pruned_bounded(self):
+        self.resolver.max_pruned = 2
+        self.resolver.max_closures = 3
+        for name in 'abcd':
+            self.resolver.add('{}-1.0-0.tar.bz2'.format(name),
+                              dict(name=name, version='1.0', build='0',
+                                   build_number=0, depends=['python']))
+        pruned_a = self.resolver.pruned(['a'])
+        self.resolver.pruned(['b'])
+        self.assertIs(self.resolver.pruned(['a']), pruned_a)
+        # b is now the least recently used, and is dropped for c.
+        self.resolver.pruned(['c'])
+        self.assertEqual(set(self.resolver._pruned),
+                         set([frozenset(['a']), frozenset(['c'])]))
+        # Dropping a closure drops its pruned resolver too.
+        self.resolver.closure(['c'])
+        self.resolver.closure(['d'])
+        self.resolver.closure(['python'])
+        self.assertEqual(set(self.resolver._pruned), set([frozenset(['c'])]))
+        self.assertEqual(len(self.resolver._closures), 3)
+
+    def test_lazy(self):
+        self.resolver.add('a-1.0-0.tar.bz2',
+                          dict(name='a', version='1.0', build='0',
+                               build_number=0, depends=['python']))
+        self.assertEqual(self.resolver.n_constructed, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+import threading
+import unittest
+
+from conda_build_all.delivery import DeliveryStage
+from conda_build_all.tests.unit.dummy_index import DummyPackage
+
+
+class Test_DeliveryStage(unittest.TestCase):
+    def setUp(self):
+        self.delivered = []
+        # Deliveries block until released, to simulate a slow upload.
+        self.release = threading.Event()
+
+    def deliver(self, meta, built_dist_location, was_built):
+        self.release.wait()
+        if meta.name() == 'bad':
+            raise ValueError('Upload failed')
+        self.delivered.append((meta.name(), built_dist_location, was_built))
+
+    def test_foreground(self):
+        self.release.set()
+        stage = DeliveryStage(self.deliver)
+        stage.put(DummyPackage('a'), 'a.tar.bz2', True)
+        self.assertEqual(self.delivered, [('a', 'a.tar.bz2', True)])
+        with self.assertRaises(ValueError):
+            stage.put(DummyPackage('bad'), 'bad.tar.bz2', True)
+        stage.close()
+
+    def test_background(self):
+        stage = DeliveryStage(self.deliver, maxsize=2)
+        stage.put(DummyPackage('a'), 'a.tar.bz2', True)
+        stage.put(DummyPackage('b'), 'b.tar.bz2', False)
+        # Neither has been delivered, but put doesn't wait for them.
+        self.assertEqual(stage.pending('a'), 1)
+        self.assertEqual(self.delivered, [])
+        self.release.set()
+        stage.wait_for(['a', 'b'])
+        self.assertEqual(stage.pending('a'), 0)
+        self.assertEqual(self.delivered, [('a', 'a.tar.bz2', True),
+                                          ('b', 'b.tar.bz2', False)])
+        stage.close()
+
+    def test_failures_raised_on_close(self):
+        self.release.set()
+        stage = DeliveryStage(self.deliver, maxsize=1)
+        for name in ['bad', 'a']:
+            stage.put(DummyPackage(name), name, True)
+        # A failed delivery doesn't leave dependents waiting.
+        stage.wait_for(['bad'])
+        with self.assertRaises(RuntimeError) as cm:
+            stage.close()
+        self.assertIn('bad-0.0-0', str(cm.exception))
+        self.assertIn('Upload failed', str(cm.exception))
+        self.assertEqual(self.delivered, [('a', 'a', True)])
+        self.assertTrue(stage.failed('bad'))
+        self.assertFalse(stage.failed('a'))
+
+    def test_put_without_blocking(self):
+        stage = DeliveryStage(self.deliver, maxsize=1)
+        # The first is taken by the background thread (which is then held
+        # up delivering it), the second fills the queue.
+        stage.put(DummyPackage('a'), 'a', True)
+        stage.put(DummyPackage('b'), 'b', True)
+        self.assertFalse(stage.put(DummyPackage('c'), 'c', True, block=False))
+        self.assertEqual(stage.pending('c'), 0)
+        self.release.set()
+        stage.close()
+        self.assertNotIn('c', [name for name, _, _ in self.delivered])
+
+    def test_on_delivered(self):
+        self.release.set()
+        delivered = threading.Event()
+        stage = DeliveryStage(self.deliver, maxsize=1,
+                              on_delivered=delivered.set)
+        stage.put(DummyPackage('bad'), 'bad', True)
+        # Called for failed deliveries too.
+        self.assertTrue(delivered.wait(5))
+        with self.assertRaises(RuntimeError):
+            stage.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,51 @@
+import unittest
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+from conda_build_all.index_session import IndexSession
+from conda_build_all.repodata import ChannelSnapshot, RepodataCache
+from conda_build_all.tests.unit.dummy_index import DummyIndex
+
+
+class Test_IndexSession(unittest.TestCase):
+    def setUp(self):
+        self.index = DummyIndex()
+        self.index.add_pkg('numpy', '1.10.4', fn='numpy-1.10.4-0.tar.bz2',
+                           channel='https://example.com/c1/linux-64/')
+        self.index.add_pkg('numpy', '1.11.0', fn='numpy-1.11.0-0.tar.bz2',
+                           channel='https://example.com/c1/linux-64/')
+        self.repodata_cache = RepodataCache()
+
+    def fetch_all(self, urls):
+        return [ChannelSnapshot(url, ['a-1.0-0.tar.bz2']) for url in urls]
+
+    def test_index_channels_not_fetched(self):
+        session = IndexSession(index=self.index, repodata_cache=self.repodata_cache)
+        urls = ['https://example.com/c1/linux-64', 'https://example.com/c2/linux-64']
+        with mock.patch.object(self.repodata_cache, 'fetch_all',
+                               side_effect=self.fetch_all) as fetch_all:
+            snapshots = session.snapshots(urls)
+            # A second request for the same channels fetches nothing.
+            session.snapshots(urls)
+        self.assertEqual([snapshot.fnames for snapshot in snapshots],
+                         [{'numpy-1.10.4-0.tar.bz2', 'numpy-1.11.0-0.tar.bz2'},
+                          {'a-1.0-0.tar.bz2'}])
+        self.assertEqual([call[0][0] for call in fetch_all.call_args_list],
+                         [['https://example.com/c2/linux-64'], []])
+
+    def test_latest_package(self):
+        session = IndexSession(index=self.index, repodata_cache=self.repodata_cache)
+        self.assertEqual(session.latest_package('numpy').version, '1.11.0')
+        self.assertIsNone(session.latest_package('scipy'))
+        # The resolver is shared, and the index is left untouched.
+        self.assertIs(session.resolver, session.resolver)
+        session.resolver.add('scipy-1.0-0.tar.bz2',
+                             dict(name='scipy', version='1.0', build='0',
+                                  build_number=0, depends=[]))
+        self.assertEqual(len(self.index), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+import unittest
+
+import binstar_client
+
+from conda_build_all.conda_interface import subdir
+from conda_build_all.inspect_binstar import OwnerInventory, owner_inventory
+from conda_build_all.tests.unit.dummy_index import DummyPackage
+
+
+class StandInClient(object):
+    # Stands in for the binstar client, serving the packages of one owner.
+    def __init__(self, owner, packages):
+        self.owner = owner
+        self.packages = packages
+        self.requests = []
+
+    def package(self, owner, name):
+        self.requests.append((owner, name))
+        if owner != self.owner or name not in self.packages:
+            raise binstar_client.NotFound('{}/{}'.format(owner, name))
+        return self.packages[name]
+
+
+class Test_OwnerInventory(unittest.TestCase):
+    def setUp(self):
+        basename = '{}/a-1.0-0.tar.bz2'.format(subdir)
+        self.basename = basename
+        self.client = StandInClient('owner', {
+            'a': {'versions': ['1.0', '2.0'],
+                  'files': [{'basename': basename, 'version': '1.0',
+                             'md5': 'abc', 'sha256': 'def'}]}})
+        self.inventory = OwnerInventory(self.client, 'owner')
+
+    def test_one_request_per_package(self):
+        self.inventory.load(['a', 'b'])
+        self.assertTrue(self.inventory.distribution_exists(DummyPackage('a', version='1.0')))
+        self.assertFalse(self.inventory.distribution_exists(DummyPackage('a', version='2.0')))
+        self.assertFalse(self.inventory.distribution_exists(DummyPackage('b', version='1.0')))
+        self.assertTrue(self.inventory.release_exists('a', '2.0'))
+        self.assertFalse(self.inventory.package_exists('b'))
+        self.assertEqual(self.client.requests, [('owner', 'a'), ('owner', 'b')])
+        self.assertEqual(self.inventory.n_requests, 2)
+        self.assertEqual(self.inventory.n_skipped, 5)
+
+    def test_other_client(self):
+        client = StandInClient('owner', self.client.packages)
+        self.assertTrue(self.inventory.release_exists('a', '2.0', binstar_cli=client))
+        self.assertEqual(client.requests, [('owner', 'a')])
+        self.assertEqual(self.client.requests, [])
+
+    def test_file_info(self):
+        info = self.inventory.file_info('a', self.basename)
+        self.assertEqual((info['md5'], info['sha256']), ('abc', 'def'))
+        self.assertIsNone(self.inventory.file_info('a', 'noarch/a-1.0-0.tar.bz2'))
+
+    def test_updated_locally(self):
+        self.inventory.load(['a', 'b'])
+        basename = '{}/b-1.0-0.tar.bz2'.format(subdir)
+        self.inventory.add_file('b', '1.0', basename)
+        self.assertTrue(self.inventory.release_exists('b', '1.0'))
+        self.assertTrue(self.inventory.distribution_exists(DummyPackage('b', version='1.0')))
+        self.inventory.remove_file('a', self.basename)
+        self.assertFalse(self.inventory.distribution_exists(DummyPackage('a', version='1.0')))
+        self.assertTrue(self.inventory.release_exists('a', '1.0'))
+        self.assertEqual(self.client.requests, [('owner', 'a'), ('owner', 'b')])
+
+    def test_not_listed(self):
+        # Changes to packages which haven't been listed don't need a request.
+        self.inventory.add_file('c', '1.0', '{}/c-1.0-0.tar.bz2'.format(subdir))
+        self.inventory.remove_file('a', self.basename)
+        self.assertEqual(self.client.requests, [])
+        self.assertTrue(self.inventory.distribution_exists(DummyPackage('a', version='1.0')))
+
+    def test_shared(self):
+        inventory = owner_inventory(self.client, 'owner')
+        self.assertIs(owner_inventory(self.client, 'owner'), inventory)
+        self.assertIsNot(owner_inventory(self.client, 'other_owner'), inventory)
+        self.assertIsNot(owner_inventory(StandInClient('owner', {}), 'owner'), inventory)
+        self.assertTrue(inventory.package_exists('a'))
+        self.assertEqual(self.client.requests, [('owner', 'a')])
+
+
+if __name__ == '__main__':
+    unittest.main()
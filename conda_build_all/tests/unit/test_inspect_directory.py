@@ -0,0 +1,94 @@
+import json
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from conda_build_all.inspect_directory import (DirectoryIndex, dist_name,
+                                               scan_artefacts)
+
+
+class Test_DirectoryIndex(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix='artefacts')
+        self.cache_directory = tempfile.mkdtemp(prefix='directory_index')
+        for fname in ['a-1.0-0.tar.bz2', 'b-2.0-py27_0.conda', 'README']:
+            self.touch(fname)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+        shutil.rmtree(self.cache_directory)
+
+    def touch(self, fname, mtime=None):
+        with open(os.path.join(self.directory, fname), 'w'):
+            pass
+        if mtime is not None:
+            os.utime(os.path.join(self.directory, fname), (mtime, mtime))
+
+    def set_directory_mtime(self, mtime):
+        os.utime(self.directory, (mtime, mtime))
+
+    def test_dist_name(self):
+        self.assertEqual(dist_name('a/b-2.0-py27_0.conda'), 'b-2.0-py27_0')
+        self.assertEqual(dist_name('a-1.0-0.tar.bz2'), 'a-1.0-0')
+        self.assertIsNone(dist_name('repodata.json'))
+
+    def test_scan(self):
+        self.assertEqual(scan_artefacts(self.directory),
+                         {'a-1.0-0.tar.bz2', 'b-2.0-py27_0.conda'})
+
+    def test_repodata_just_older(self):
+        # An artefact added just after repodata.json was written is listed.
+        with open(os.path.join(self.directory, 'repodata.json'), 'w') as fh:
+            json.dump({'packages': {'a-1.0-0.tar.bz2': {}}}, fh)
+        os.utime(os.path.join(self.directory, 'repodata.json'), (1000, 1000))
+        self.set_directory_mtime(1001)
+        self.assertEqual(DirectoryIndex().artefacts(self.directory),
+                         {'a-1.0-0.tar.bz2', 'b-2.0-py27_0.conda'})
+
+    def test_missing_directory(self):
+        index = DirectoryIndex()
+        self.assertEqual(index.artefacts(os.path.join(self.directory, 'missing')),
+                         frozenset())
+
+    def test_mtime_validation(self):
+        index = DirectoryIndex()
+        self.set_directory_mtime(1000)
+        self.assertEqual(len(index.artefacts(self.directory)), 2)
+        # The cached listing is used whilst the mtime is unchanged.
+        self.touch('c-1.0-0.tar.bz2')
+        self.set_directory_mtime(1000)
+        self.assertEqual(len(index.artefacts(self.directory)), 2)
+        self.set_directory_mtime(2000)
+        self.assertEqual(len(index.artefacts(self.directory)), 3)
+
+    def test_persisted(self):
+        self.set_directory_mtime(1000)
+        DirectoryIndex(self.cache_directory).artefacts(self.directory)
+        self.touch('c-1.0-0.tar.bz2')
+        self.set_directory_mtime(1000)
+        index = DirectoryIndex(self.cache_directory)
+        self.assertEqual(len(index.artefacts(self.directory)), 2)
+
+    def test_repodata(self):
+        now = time.time()
+        with open(os.path.join(self.directory, 'repodata.json'), 'w') as fh:
+            json.dump({'packages': {'a-1.0-0.tar.bz2': {}},
+                       'packages.conda': {'d-1.0-0.conda': {}}}, fh)
+        os.utime(os.path.join(self.directory, 'repodata.json'), (now, now))
+        self.set_directory_mtime(now)
+        self.assertEqual(DirectoryIndex().artefacts(self.directory),
+                         {'a-1.0-0.tar.bz2', 'd-1.0-0.conda'})
+
+    def test_stale_repodata(self):
+        with open(os.path.join(self.directory, 'repodata.json'), 'w') as fh:
+            json.dump({'packages': {}}, fh)
+        os.utime(os.path.join(self.directory, 'repodata.json'), (1000, 1000))
+        self.set_directory_mtime(2000)
+        self.assertEqual(DirectoryIndex().artefacts(self.directory),
+                         {'a-1.0-0.tar.bz2', 'b-2.0-py27_0.conda'})
+
+
+if __name__ == '__main__':
+    unittest.main()
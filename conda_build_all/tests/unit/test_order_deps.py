@@ -14,6 +14,20 @@ class Test_resolve_dependencies(unittest.TestCase):
         with self.assertRaises(ValueError):
             list(deps)
 
+    def test_cycle_reported(self):
+        deps = resolve_dependencies({'a': ['b'], 'b': ['c'], 'c': ['a'],
+                                     'd': ['a'], 'e': []})
+        with self.assertRaises(ValueError) as cm:
+            list(deps)
+        self.assertIn('a -> b -> c -> a', str(cm.exception))
+
+    def test_tie_break(self):
+        # Within a pass over the sorted packages, a package can follow a
+        # dependency which sorts before it, otherwise it waits a pass.
+        deps = resolve_dependencies({'a': ['c'], 'b': [], 'c': [],
+                                     'd': ['b'], 'e': ['d', 'a']})
+        self.assertEqual(list(deps), ['b', 'c', 'd', 'a', 'e'])
+
     def test_missing_link(self):
         deps = resolve_dependencies({'a': 'b', 'c': 'd'})
         with self.assertRaises(ValueError):
@@ -0,0 +1,69 @@
+import os
+import shutil
+import unittest
+
+from conda_build_all.builder import list_metas
+from conda_build_all.render_cache import RenderCache, recipe_digest
+from conda_build_all.tests.integration.test_builder import RecipeCreatingUnit
+
+
+class Test_RenderCache(RecipeCreatingUnit):
+    def setUp(self):
+        super(Test_RenderCache, self).setUp()
+        self.write_meta('m1', """
+            package:
+                name: m1
+            """)
+        self.write_meta('m2', """
+            package:
+                name: m2
+            """)
+        self.cache = RenderCache(self.tmp_dir(prefix='render_cache'))
+
+    def test_hits_and_misses(self):
+        metas = list_metas(self.recipes_root_dir, cache=self.cache)
+        self.assertEqual((self.cache.hits, self.cache.misses), (0, 2))
+        cached_metas = list_metas(self.recipes_root_dir, cache=self.cache)
+        self.assertEqual((self.cache.hits, self.cache.misses), (2, 2))
+        self.assertEqual([meta.name() for meta in cached_metas],
+                         [meta.name() for meta in metas])
+
+    def test_changed_recipe(self):
+        list_metas(self.recipes_root_dir, cache=self.cache)
+        self.write_meta('m1', """
+            package:
+                name: m1_renamed
+            """)
+        metas = list_metas(self.recipes_root_dir, cache=self.cache)
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 3))
+        self.assertEqual(sorted(meta.name() for meta in metas),
+                         ['m1_renamed', 'm2'])
+
+    def test_moved_recipes(self):
+        list_metas(self.recipes_root_dir, cache=self.cache)
+        moved_root_dir = os.path.join(self.tmp_dir(prefix='moved'), 'recipes')
+        shutil.copytree(self.recipes_root_dir, moved_root_dir)
+        metas = list_metas(moved_root_dir, cache=self.cache)
+        self.assertEqual((self.cache.hits, self.cache.misses), (0, 4))
+        self.assertEqual(sorted(meta.path for meta in metas),
+                         [os.path.join(moved_root_dir, name) for name in ['m1', 'm2']])
+
+    def test_nested_recipe_excluded(self):
+        digest = recipe_digest(self.recipes_root_dir)
+        self.write_meta('m1', """
+            package:
+                name: m1_renamed
+            """)
+        self.assertEqual(recipe_digest(self.recipes_root_dir), digest)
+        self.assertNotEqual(recipe_digest(os.path.join(self.recipes_root_dir, 'm1')),
+                            digest)
+
+    def test_evict(self):
+        list_metas(self.recipes_root_dir, cache=self.cache)
+        self.cache.max_size = 0
+        self.cache.evict()
+        self.assertEqual(os.listdir(self.cache.directory), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,109 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+try:
+    from http.server import HTTPServer, BaseHTTPRequestHandler
+except ImportError:
+    from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+
+from conda_build_all.repodata import RepodataCache
+
+
+class ChannelHandler(BaseHTTPRequestHandler):
+    # Serves the server's "repodata" attribute, honouring If-None-Match.
+    def do_GET(self):
+        content = json.dumps(self.server.repodata).encode('utf-8')
+        etag = '"{}"'.format(hashlib.md5(content).hexdigest())
+        self.server.requests.append(self.path)
+        if not self.path.endswith('/linux-64/repodata.json'):
+            self.send_response(404)
+            self.end_headers()
+        elif self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.end_headers()
+        else:
+            self.send_response(200)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+
+    def log_message(self, *args):
+        pass
+
+
+class Test_RepodataCache(unittest.TestCase):
+    def setUp(self):
+        self.server = HTTPServer(('127.0.0.1', 0), ChannelHandler)
+        self.server.repodata = {'packages': {'a-1.0-0.tar.bz2': {}},
+                                'packages.conda': {'b-1.0-0.conda': {}}}
+        self.server.requests = []
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        self.url = 'http://127.0.0.1:{}/channel/linux-64'.format(self.server.server_port)
+        self.cache_dir = tempfile.mkdtemp(prefix='repodata_cache')
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.cache_dir)
+
+    def test_fetch(self):
+        snapshot = RepodataCache().fetch(self.url)
+        self.assertEqual(snapshot.fnames, {'a-1.0-0.tar.bz2', 'b-1.0-0.conda'})
+        self.assertFalse(snapshot.from_cache)
+        self.assertGreater(snapshot.n_bytes, 0)
+
+    def test_not_modified(self):
+        RepodataCache(self.cache_dir).fetch(self.url)
+        # A new instance, to check that the snapshot was persisted.
+        snapshot = RepodataCache(self.cache_dir).fetch(self.url)
+        self.assertTrue(snapshot.from_cache)
+        self.assertEqual(snapshot.n_bytes, 0)
+        self.assertEqual(snapshot.fnames, {'a-1.0-0.tar.bz2', 'b-1.0-0.conda'})
+        self.assertEqual(len(self.server.requests), 2)
+
+    def test_modified(self):
+        cache = RepodataCache(self.cache_dir)
+        cache.fetch(self.url)
+        self.server.repodata = {'packages': {'c-1.0-0.tar.bz2': {}}}
+        snapshot = cache.fetch(self.url)
+        self.assertFalse(snapshot.from_cache)
+        self.assertEqual(snapshot.fnames, {'c-1.0-0.tar.bz2'})
+
+    def test_missing(self):
+        url = self.url.replace('linux-64', 'noarch')
+        self.assertEqual(RepodataCache().fetch(url).fnames, frozenset())
+
+    def test_fetch_all(self):
+        urls = [self.url.replace('channel', name) + '/'
+                for name in ['c1', 'c2', 'c3']]
+        urls += [urls[0], self.url.replace('linux-64', 'noarch')]
+        parallel = RepodataCache(jobs=4).fetch_all(urls)
+        serial = RepodataCache(jobs=1).fetch_all(urls)
+        self.assertEqual([snapshot.url for snapshot in parallel],
+                         [url.rstrip('/') for url in urls])
+        self.assertEqual([snapshot.fnames for snapshot in parallel],
+                         [snapshot.fnames for snapshot in serial])
+        self.assertEqual(parallel[-1].fnames, frozenset())
+
+    def test_local_channel(self):
+        channel = os.path.join(self.cache_dir, 'channel', 'linux-64')
+        os.makedirs(channel)
+        with open(os.path.join(channel, 'repodata.json'), 'w') as fh:
+            json.dump(self.server.repodata, fh)
+        cache = RepodataCache()
+        url = 'file://' + channel.replace(os.path.sep, '/')
+        self.assertFalse(cache.fetch(url).from_cache)
+        snapshot = cache.fetch(url)
+        self.assertTrue(snapshot.from_cache)
+        self.assertEqual(snapshot.fnames, {'a-1.0-0.tar.bz2', 'b-1.0-0.conda'})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,8 +1,13 @@
 import os
+import pickle
 import shutil
 import tempfile
 import unittest
 import textwrap
+try:
+    from unittest import mock
+except ImportError:
+    import mock
 
 try:
     import conda_build.api
@@ -46,6 +51,38 @@ class Test_BakedDistribution(RecipeCreatingUnit):
         self.assertEqual(dist2.skip(), False)
 
 
+    def test_pickle(self):
+        meta = self.write_meta("""
+            package:
+                name: recipe_which_depends_on_py_version
+                version: 3  # [py3k]
+                version: 2  # [not py3k]
+            """)
+        dist = pickle.loads(pickle.dumps(ResolvedDistribution(meta, (('python', '27', ), ))))
+        self.assertEqual(dist.special_versions, (('python', '27', ), ))
+        self.assertEqual(dist.version(), u'2')
+
+
+    def test_parsed_once(self):
+        meta = self.write_meta("""
+            package:
+                name: recipe_which_depends_on_py_version
+                version: 3  # [py3k]
+                version: 2  # [not py3k]
+            """)
+        dist = ResolvedDistribution(meta, (('python', '27', ), ))
+        parse_again = MetaData.parse_again
+        with mock.patch.object(MetaData, 'parse_again', autospec=True,
+                               side_effect=parse_again) as parse:
+            self.assertEqual(dist.version(), u'2')
+            dist.dist()
+            dist.skip()
+            self.assertEqual(parse.call_count, 1)
+            dist.invalidate()
+            self.assertEqual(dist.version(), u'2')
+            self.assertEqual(parse.call_count, 2)
+
+
 class Test_BakedDistribution_resolve_all(RecipeCreatingUnit):
     def test_py_xx_version(self):
         meta = self.write_meta("""
@@ -1,10 +1,25 @@
+import os
+import shutil
+import sqlite3
+import tempfile
 import unittest
+try:
+    from unittest import mock
+except ImportError:
+    import mock
 
-from conda_build_all.conda_interface import MatchSpec
+from conda_build_all.conda_interface import MatchSpec, requirement_closure
 
 from conda_build_all.version_matrix import (parse_specifications,
                                             special_case_version_matrix,
+                                            SolveCache,
+                                            PersistentSolveCache,
                                             filter_cases,
+                                            MatrixConditions,
+                                            parse_version,
+                                            VersionTable,
+                                            prune_cases,
+                                            pruning_is_determined,
                                             keep_top_n_major_versions,
                                             keep_top_n_minor_versions)
 from conda_build_all.tests.unit.dummy_index import DummyPackage, DummyIndex
@@ -221,6 +236,25 @@ class Test_special_case_version_matrix(unittest.TestCase):
         self.assertEqual(set(r), set(expect_result),
                          msg='got: {}\nexpected: {}'.format(r, expect_result))
 
+    def test_numpy_duplicate_candidates(self):
+        # Many numpy builds collapse to a few python/numpy cases, each of
+        # which should be solved only once.
+        pythons = ['2.7', '3.5']
+        numpys = ['1.9', '1.10']
+        self.construct_numpy_index(pythons, numpys)
+        for build_number in ['1', '2']:
+            for python_version in pythons:
+                self.index.add_pkg('numpy', '1.10.3', 'py' + python_version.replace('.', ''),
+                                   build_number=build_number,
+                                   depends=['python ' + python_version])
+
+        a = DummyPackage('pkgA', ('numpy x.x', 'python'), ('numpy x.x', 'python'))
+        cache = SolveCache()
+        r = special_case_version_matrix(a, self.index, solve_cache=cache)
+        self.assertEqual(len(r), 4)
+        self.assertEqual((cache.hits, cache.misses), (0, 4))
+        self.assertEqual((cache.n_candidates, cache.n_unique_candidates), (8, 4))
+
     def test_perl_matrix(self):
         a = DummyPackage('pkgA', ['perl'])
         self.index.add_pkg('perl', '4.5.6')
@@ -277,6 +311,113 @@ class Test_special_case_version_matrix(unittest.TestCase):
         self.assertEqual(r, expected)
 
 
+class Test_requirement_closure(unittest.TestCase):
+    def test_transitive(self):
+        index = DummyIndex()
+        index.add_pkg('a', '1.0', depends=['b >1'])
+        index.add_pkg('b', '2.0', depends=['c'])
+        index.add_pkg('c', '1.0')
+        index.add_pkg('d', '1.0', depends=['a'])
+        self.assertEqual(requirement_closure(['a'], index), set(['a', 'b', 'c']))
+
+    def test_feature_trackers(self):
+        index = DummyIndex()
+        index.add_pkg('a', '1.0', features='mkl')
+        index.add_pkg('mkl_tracker', '1.0', track_features='mkl')
+        self.assertEqual(requirement_closure(['a'], index),
+                         set(['a', 'mkl_tracker']))
+
+
+class Test_SolveCache(unittest.TestCase):
+    def setUp(self):
+        self.index = DummyIndex()
+        self.index.add_pkg('python', '2.7.2')
+        self.index.add_pkg('python', '3.5.0')
+        self.cache = SolveCache()
+
+    def test_shared_between_recipes(self):
+        a = DummyPackage('pkgA', ['python'])
+        b = DummyPackage('pkgB', ['python'])
+        r_a = special_case_version_matrix(a, self.index, solve_cache=self.cache)
+        self.assertEqual((self.cache.hits, self.cache.misses), (0, 2))
+        r_b = special_case_version_matrix(b, self.index, solve_cache=self.cache)
+        self.assertEqual((self.cache.hits, self.cache.misses), (2, 2))
+        self.assertEqual(r_a, r_b)
+
+    def test_unrelated_index_change(self):
+        a = DummyPackage('pkgA', ['python'])
+        special_case_version_matrix(a, self.index, solve_cache=self.cache)
+        self.index.add_pkg('pkgA', '1.0', 'py27', depends=['python 2.7*'])
+        special_case_version_matrix(a, self.index, solve_cache=self.cache)
+        self.assertEqual((self.cache.hits, self.cache.misses), (2, 2))
+
+    def test_related_index_change(self):
+        a = DummyPackage('pkgA', ['python', 'wibble'])
+        self.index.add_pkg('wibble', '1.0', depends=['python <3'])
+        r = special_case_version_matrix(a, self.index, solve_cache=self.cache)
+        self.assertEqual(r, set([(('python', '2.7'),)]))
+        self.index.add_pkg('wibble', '1.0', 'py35', depends=['python 3.5*'])
+        r = special_case_version_matrix(a, self.index, solve_cache=self.cache)
+        self.assertEqual((self.cache.hits, self.cache.misses), (0, 4))
+        self.assertEqual(r, set([(('python', '2.7'),), (('python', '3.5'),)]))
+
+
+class Test_PersistentSolveCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp(prefix='solve_cache')
+        self.path = os.path.join(self.tmp_dir, 'cache.sqlite')
+        self.index = DummyIndex()
+        self.index.add_pkg('python', '2.7.2')
+        self.index.add_pkg('python', '3.5.0')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_between_runs(self):
+        a = DummyPackage('pkgA', ['python'])
+        cache = PersistentSolveCache(self.path)
+        r1 = special_case_version_matrix(a, self.index, solve_cache=cache)
+        cache.close()
+        cache = PersistentSolveCache(self.path)
+        with mock.patch('conda_build_all.conda_interface.IncrementalResolve.solve') as solve:
+            r2 = special_case_version_matrix(a, self.index, solve_cache=cache)
+        # No solver was needed at all.
+        self.assertEqual(solve.call_count, 0)
+        self.assertEqual((cache.hits, cache.misses), (2, 0))
+        self.assertEqual(r1, r2)
+
+    def test_rolled_over(self):
+        cache = PersistentSolveCache(self.path)
+        cache.set(['python 2.7*'], 'fingerprint1', True)
+        cache = PersistentSolveCache(self.path)
+        cache._session += 1
+        cache.set(['python 2.7*'], 'fingerprint2', False)
+        cache = PersistentSolveCache(self.path)
+        self.assertIsNone(cache.get(['python 2.7*'], 'fingerprint1'))
+        self.assertEqual(cache.get(['python 2.7*'], 'fingerprint2'), False)
+
+    def last_used(self):
+        connection = sqlite3.connect(self.path)
+        try:
+            return [row[0] for row in connection.execute('SELECT last_used FROM solvable')]
+        finally:
+            connection.close()
+
+    def test_last_used_batched(self):
+        cache = PersistentSolveCache(self.path)
+        cache.set(['python 2.7*'], 'fingerprint1', True)
+        cache.close()
+        first_session = cache._session
+        cache = PersistentSolveCache(self.path)
+        cache._session += 1
+        self.assertTrue(cache.get(['python 2.7*'], 'fingerprint1'))
+        # A hit doesn't write anything...
+        self.assertEqual(self.last_used(), [first_session])
+        cache.close()
+        # ... until the cache is closed.
+        self.assertEqual(self.last_used(), [cache._session])
+
+
 class Test_parse_specification(unittest.TestCase):
     def test_specification_no_duplicates(self):
         # Do specifications that are all on one-liners get handled correctly?
@@ -382,6 +523,21 @@ class Test_filter_cases(CasesTestCase):
                  [self.item['py35'], self.item['o13']])
         self.assertEqual(tuple(filter_cases(cases, ['other 1.2.*'])), cases[:2])
 
+    def test_compiled_conditions(self):
+        cases = ([self.item['py26'], self.item['o12']],
+                 [self.item['py34'], self.item['o12']],
+                 [self.item['py35'], self.item['o13']])
+        conditions = MatrixConditions(['python >=3', 'other 1.2.*'])
+        self.assertEqual(tuple(filter_cases(cases, conditions)), cases[1:2])
+        self.assertEqual(tuple(filter_cases(cases[::-1], conditions)), cases[1:2])
+        # Each pair is only matched once.
+        self.assertEqual(len(conditions._results), 5)
+
+    def test_conditions_unrelated_package(self):
+        conditions = MatrixConditions(['python >=3'])
+        self.assertTrue(conditions.match('numpy', '1.8'))
+        self.assertEqual(conditions._results, {})
+
 
 class Test_keep_top_n_major_versions(CasesTestCase):
     def test_keep_less_than_n(self):
@@ -456,10 +612,85 @@ class Test_keep_top_n_minor_versions(CasesTestCase):
         self.assertEqual(tuple(keep_top_n_minor_versions(cases, 1)),
                          cases[2:])
 
+    def test_non_integer_versions(self):
+        cases = ([('perl', '5.22.0')],
+                 [('perl', '5.22rc1')],
+                 [('perl', '5.20.2')])
+        self.assertEqual(tuple(keep_top_n_minor_versions(iter(cases), 1)),
+                         cases[:2])
 
 
-#    def test_keep_0(self):
-
+class Test_pruning_is_determined(CasesTestCase):
+    def test_determined(self):
+        # Whether or not py26 is solvable, the result is py27 & py35.
+        cases = ([self.item['py26']],
+                 [self.item['py27']],
+                 [self.item['py35']])
+        self.assertEqual(prune_cases(cases, (2, 1)), list(cases[1:]))
+        self.assertTrue(pruning_is_determined(cases, (2, 1)))
+
+    def test_not_determined(self):
+        # Without the last case, none of the cases survive the pruning, so
+        # the result depends on which of them are solvable.
+        cases = ([self.item['py35'], self.item['np19']],
+                 [self.item['py34'], self.item['np110']],
+                 [self.item['py35'], self.item['np110']])
+        self.assertEqual(prune_cases(cases, (1, 1)), list(cases[2:]))
+        self.assertTrue(pruning_is_determined(cases, (1, 1)))
+        self.assertFalse(pruning_is_determined(cases[:2], (1, 1)))
+
+
+class Test_VersionTable(unittest.TestCase):
+    def test_parse_version(self):
+        self.assertEqual(parse_version('1.10.2'), (1, 10, 2))
+        self.assertEqual(parse_version('1.8rc1'), (1, 8, -1))
+        self.assertEqual(parse_version('2'), (2, -1, -1))
+
+    def test_parsed_once(self):
+        table = VersionTable.from_cases([[('python', '2.7')],
+                                         [('python', '2.7'), ('numpy', '1.10.4')]])
+        self.assertEqual(len(table), 2)
+        self.assertEqual(table.parsed('numpy', '1.10.4'), (1, 10, 4))
+        self.assertEqual(table.minor_vn('numpy', '1.10.4'), '1.10')
+
+    def test_keep_top_n(self):
+        table = VersionTable([('python', '2.6'), ('python', '2.7'),
+                              ('python', '3.5'), ('numpy', '1.10')])
+        self.assertEqual(table.keep_top_n_major(1),
+                         {('python', '3.5'), ('numpy', '1.10')})
+        self.assertEqual(table.keep_top_n_minor(1),
+                         {('python', '2.7'), ('python', '3.5'), ('numpy', '1.10')})
+
+    def test_keep_top_n_of_pairs(self):
+        # Only the given pairs set the cutoffs.
+        table = VersionTable([('python', '2.6'), ('python', '2.7'),
+                              ('python', '3.5')])
+        self.assertEqual(table.keep_top_n_major(1, [('python', '2.6'),
+                                                    ('python', '2.7')]),
+                         {('python', '2.6'), ('python', '2.7')})
+        self.assertEqual(table.keep_top_n_minor(1, [('python', '2.6')]),
+                         {('python', '2.6')})
+
+    def test_prune_with_shared_table(self):
+        table = VersionTable()
+        cases = [(('python', '2.7'), ('numpy', '1.9')),
+                 (('python', '3.5'), ('numpy', '1.10'))]
+        self.assertEqual(prune_cases(cases, (1, 1), table), cases[1:])
+        self.assertEqual(len(table), 4)
+        self.assertEqual(prune_cases(cases, (2, 2), table), cases)
+        self.assertEqual(len(table), 4)
+
+    def test_for_index(self):
+        index = DummyIndex()
+        index.add_pkg('python', '2.7.2')
+        table = VersionTable.for_index(index)
+        self.assertIs(VersionTable.for_index(index), table)
+        self.assertIsNot(VersionTable.for_index(DummyIndex()), table)
+
+    def test_minor_vn_empty_table(self):
+        table = VersionTable()
+        self.assertEqual(table.minor_vn('numpy', '1.10.4'), '1.10')
+        self.assertEqual(len(table), 1)
 
 
 if __name__ == '__main__':
@@ -1,10 +1,16 @@
 from contextlib import contextmanager
 from collections import defaultdict
+import hashlib
 import logging
+import os
+import sqlite3
 import sys
+import time
+import weakref
 
-from .conda_interface import (MatchSpec, Unsatisfiable, NoPackagesFound, Resolve,
-                              get_key, copy_index, ensure_dist_or_dict)
+from .conda_interface import (MatchSpec, Unsatisfiable, NoPackagesFound,
+                              copy_index, ensure_dist_or_dict, OverlayIndex,
+                              IncrementalResolve, index_by_name)
 
 try:
     import conda_build.api
@@ -24,6 +30,8 @@ class StdoutNewline(logging.Handler):
             pass
 
 
+log = logging.getLogger(__name__)
+
 stdout = logging.getLogger('conda_build_all.version_matrix.stdoutlog')
 stdout.addHandler(StdoutNewline())
 stdout.setLevel(logging.WARNING)
@@ -99,7 +107,198 @@ def parse_specifications(requirements):
     return requirement_specs
 
 
-def special_case_version_matrix(meta, index):
+def index_fingerprint(index, names, by_name=None):
+    """
+    Return a digest of the records of the index for the given package names.
+
+    """
+    if by_name is None:
+        by_name = index_by_name(index)
+    digest = hashlib.sha1()
+    for name in sorted(names):
+        for key in sorted(by_name.get(name, ()), key=str):
+            info = index[key]
+            record = '|'.join([str(key), info.get('md5') or '',
+                               ','.join(sorted(info.get('depends', ()))),
+                               info.get('features') or '',
+                               info.get('track_features') or ''])
+            digest.update(record.encode('utf-8'))
+            digest.update(b'\n')
+    return digest.hexdigest()
+
+
+class SolveCache(object):
+    """
+    A cache of whether a set of specifications can be solved against an
+    index, which may be shared across many calls to
+    :func:`special_case_version_matrix`.
+
+    Each entry is keyed on the (sorted) specifications and a fingerprint of
+    the index records which could take part in the solve (see
+    :func:`~conda_build_all.conda_interface.requirement_closure`), so adding
+    unrelated records to the index, as
+    :meth:`conda_build_all.builder.Builder.compute_build_distros` does,
+    doesn't invalidate the cache.
+
+    """
+    #: The names of the counters, which are summed over worker processes.
+    counters = ('hits', 'misses', 'n_candidates', 'n_unique_candidates')
+
+    def __init__(self):
+        self._solvable = {}
+        self.hits = 0
+        self.misses = 0
+        #: The number of python/numpy candidate cases, before and after
+        #: removing duplicates (see :func:`special_case_version_matrix`).
+        self.n_candidates = 0
+        self.n_unique_candidates = 0
+
+    def __repr__(self):
+        return '<{} with {} entries: {} hits, {} misses>'.format(
+            type(self).__name__, len(self._solvable), self.hits, self.misses)
+
+    def get(self, specs, fingerprint):
+        """
+        Return whether the given specs are solvable, or None if they aren't
+        in the cache.
+
+        """
+        key = (tuple(sorted(specs)), fingerprint)
+        solvable = self._solvable.get(key)
+        if solvable is None:
+            solvable = self._load(*key)
+            if solvable is not None:
+                self._solvable[key] = solvable
+        if solvable is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return solvable
+
+    def set(self, specs, fingerprint, solvable):
+        key = (tuple(sorted(specs)), fingerprint)
+        self._solvable[key] = bool(solvable)
+        self._store(key[0], fingerprint, bool(solvable))
+
+    def flush(self):
+        """Write anything pending to the cache's storage, if it has any."""
+        pass
+
+    def close(self):
+        """Flush, and release the cache's storage, if it has any."""
+        pass
+
+    def _load(self, specs, fingerprint):
+        return None
+
+    def _store(self, specs, fingerprint, solvable):
+        pass
+
+
+class PersistentSolveCache(SolveCache):
+    """
+    A :class:`SolveCache` which is backed by an SQLite database, such that
+    the results are re-used between runs.
+
+    Since the index fingerprint of an entry changes when the repodata of a
+    package involved in the solve changes, storing the result for a new
+    fingerprint evicts the entries for the old fingerprints of those specs
+    (other than those which have been used by this cache instance).
+
+    The times at which entries were last used are recorded in batches: with
+    the next stored entry, or on :meth:`flush` or :meth:`close`.
+
+    """
+    def __init__(self, path):
+        super(PersistentSolveCache, self).__init__()
+        self.path = path
+        self._connection = None
+        self._connection_pid = None
+        self._session = time.time()
+        # The (specs, fingerprint) keys of the entries used since their
+        # last_used was last written.
+        self._used = set()
+
+    @classmethod
+    def from_config(cls, config):
+        """Create a PersistentSolveCache in the conda-build root of the given config."""
+        return cls(os.path.join(config.croot, 'conda-build-all', 'solve-cache.sqlite'))
+
+    @property
+    def connection(self):
+        # SQLite connections can't be shared with forked processes, so each
+        # process gets its own.
+        if self._connection is None or self._connection_pid != os.getpid():
+            directory = os.path.dirname(self.path)
+            if directory and not os.path.isdir(directory):
+                os.makedirs(directory)
+            self._connection = sqlite3.connect(self.path, timeout=60)
+            self._connection_pid = os.getpid()
+            with self._connection:
+                self._connection.execute(
+                    'CREATE TABLE IF NOT EXISTS solvable ('
+                    'specs TEXT NOT NULL, fingerprint TEXT NOT NULL, '
+                    'solvable INTEGER NOT NULL, last_used REAL NOT NULL, '
+                    'PRIMARY KEY (specs, fingerprint))')
+        return self._connection
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_connection'] = state['_connection_pid'] = None
+        return state
+
+    def _load(self, specs, fingerprint):
+        key = ('\n'.join(specs), fingerprint)
+        row = self.connection.execute(
+            'SELECT solvable FROM solvable WHERE specs = ? AND fingerprint = ?',
+            key).fetchone()
+        if row is not None:
+            self._used.add(key)
+            return bool(row[0])
+
+    def _write_used(self):
+        # Within a transaction of the caller.
+        used, self._used = self._used, set()
+        self.connection.executemany(
+            'UPDATE solvable SET last_used = ? WHERE specs = ? AND fingerprint = ?',
+            [(self._session, ) + key for key in used])
+
+    def flush(self):
+        if self._used:
+            with self.connection:
+                self._write_used()
+
+    def close(self):
+        self.flush()
+        if self._connection is not None and self._connection_pid == os.getpid():
+            self._connection.close()
+        self._connection = self._connection_pid = None
+
+    def _store(self, specs, fingerprint, solvable):
+        specs = '\n'.join(specs)
+        with self.connection:
+            # The entries used by this instance must not be evicted.
+            self._write_used()
+            self.connection.execute(
+                'DELETE FROM solvable WHERE specs = ? AND fingerprint != ? '
+                'AND last_used < ?', (specs, fingerprint, self._session))
+            self.connection.execute(
+                'INSERT OR REPLACE INTO solvable VALUES (?, ?, ?, ?)',
+                (specs, fingerprint, int(solvable), self._session))
+
+
+def matrix_requirement_names(meta):
+    """
+    Return the names of the packages which the version matrix of the given
+    meta is solved over. Only the records in the requirement closure of
+    these names can influence the result of :func:`special_case_version_matrix`.
+
+    """
+    return frozenset(parse_specifications(meta.get_value('requirements/build', []) or []))
+
+
+def special_case_version_matrix(meta, index, solve_cache=None, resolver=None,
+                                assume_solvable=False):
     """
     Return the non-orthogonal version matrix for special software within conda
     (numpy, python).
@@ -120,9 +319,31 @@ def special_case_version_matrix(meta, index):
         ... setup the case ...
         ... build ...
 
+    If a :class:`SolveCache` is given, it will be used to avoid repeating
+    solves which have already been done for other recipes. Similarly, an
+    :class:`~conda_build_all.conda_interface.IncrementalResolve` of the
+    index may be given, in which case its index is used in place of the
+    given index, and its resolver is re-used for all of the solves.
+
+    If ``assume_solvable`` is True, no solves are done at all, and all of the
+    candidate cases are returned.
+
     """
-    index = copy_index(index)
-    r = Resolve(index)
+    if resolver is None:
+        # Work on an overlay of the index, so as not to modify the given index.
+        if not isinstance(index, OverlayIndex):
+            index = copy_index(index)
+        index = OverlayIndex(index)
+        # The resolver is only constructed if a solve is actually needed,
+        # which it may not be if all of the solves are in the solve cache.
+        resolver = IncrementalResolve(index)
+    index = resolver.index
+    by_name = index_by_name(index)
+
+    def solve(specs):
+        # Only the part of the index which is reachable from the specs is
+        # given to the solver.
+        return resolver.solve_pruned(specs)
 
     requirements = meta.get_value('requirements/build', [])
     requirement_specs = parse_specifications(requirements)
@@ -157,71 +378,119 @@ def special_case_version_matrix(meta, index):
                 ms = MatchSpec(name)
             requirement_specs[pkg] = ms
 
-    def minor_vn(version_str):
+    # The parsed versions of the records in the index, shared between recipes.
+    version_table = VersionTable.for_index(index)
+
+    def minor_vn(key):
         """
-        Take an string of the form 1.8.2, into string form 1.8
+        Take the version of the given record, of the form 1.8.2, into string
+        form 1.8
         """
-        return '.'.join(version_str.split('.')[:2])
+        info = index[key]
+        return version_table.minor_vn(info['name'], info['version'])
 
     cases = set()
     unsolvable_cases = set()
 
-    def get_pkgs(spec):
+    # The index fingerprints, keyed on the package names being solved for.
+    fingerprints = {}
+
+    def fingerprint(specs):
+        names = frozenset(spec.split()[0] for spec in specs)
+        if names not in fingerprints:
+            closure = resolver.closure(names)
+            fingerprints[names] = index_fingerprint(index, closure, by_name)
+        return fingerprints[names]
+
+    def solvable(specs):
         try:
-            # should be r.get_dists_for_spec(spec) for conda-4.3+
-            return r.get_pkgs(spec)
+            # Figure out if this case is actually resolvable. We don't care how,
+            # just that it could be.
+            solve(specs)
         except NO_PACKAGES_EXCEPTION:
-            # If no package is found in the channel, we do nothing
-            # this is reasonable because add_case_if_soluble does the same
-            # for concrete cases.
-            # This behavior is important because otherwise this will crash if
-            # a package is not available for a certain platform (e.g. win).
-            return []
+            return False
+        else:
+            return True
+
+    def get_pkgs(spec):
+        # Return the keys of the index which match the spec. If no package is
+        # found in the channel, we do nothing - this is reasonable because
+        # add_case_if_soluble does the same for concrete cases. This behavior
+        # is important because otherwise this will crash if a package is not
+        # available for a certain platform (e.g. win).
+        return [key for key in by_name.get(spec.name, ()) if spec.match(key)]
 
     def add_case_if_soluble(case):
         # Whilst we strictly don't need to, shortcutting cases we've already seen makes a
         # *huge* performance difference.
-        if case in cases | unsolvable_cases:
+        if case in cases or case in unsolvable_cases:
+            return
+        if assume_solvable:
+            cases.add(case)
             return
 
         specs = ([ms.spec for ms in requirement_specs.values()] +
                  ['{} {}*'.format(pkg, version) for pkg, version in case])
 
-        try:
-            # Figure out if this case is actually resolvable. We don't care how,
-            # just that it could be.
-            r.solve(specs)
-        except NO_PACKAGES_EXCEPTION:
-            unsolvable_cases.add(case)
+        if solve_cache is None:
+            is_solvable = solvable(specs)
         else:
+            is_solvable = solve_cache.get(specs, fingerprint(specs))
+            if is_solvable is None:
+                is_solvable = solvable(specs)
+                solve_cache.set(specs, fingerprint(specs), is_solvable)
+
+        if is_solvable:
             cases.add(case)
+        else:
+            unsolvable_cases.add(case)
 
     with override_conda_logging(logging.WARN):
         if 'numpy' in requirement_specs:
             np_spec = requirement_specs.pop('numpy')
             py_spec = requirement_specs.pop('python', None)
+            # Group the numpy builds by minor version and python dependency,
+            # such that each python dependency is looked up only once, and
+            # each unique case is solved only once.
+            np_python_deps = defaultdict(int)
             for numpy_pkg in get_pkgs(np_spec):
-                np_vn = minor_vn(index[get_key(numpy_pkg)]['version'])
-                numpy_deps = index[get_key(numpy_pkg)]['depends']
-                numpy_deps = {MatchSpec(spec).name: MatchSpec(spec)
-                              for spec in numpy_deps}
+                np_vn = minor_vn(numpy_pkg)
+                numpy_deps = {MatchSpec(spec).name: spec
+                              for spec in index[numpy_pkg]['depends']}
                 # This would be problematic if python wasn't a dep of numpy.
-                for python_pkg in get_pkgs(numpy_deps['python']):
-                    if py_spec and not py_spec.match(get_key(python_pkg)):
-                        continue
-                    py_vn = minor_vn(index[get_key(python_pkg)]['version'])
-                    case = (('python', py_vn),
-                            ('numpy', np_vn),
-                            )
-                    add_case_if_soluble(case)
+                np_python_deps[(np_vn, numpy_deps['python'])] += 1
+
+            python_vns = {}
+            n_candidates = 0
+            candidates = set()
+            for (np_vn, python_dep), n_numpy_pkgs in np_python_deps.items():
+                if python_dep not in python_vns:
+                    python_vns[python_dep] = [
+                        minor_vn(python_pkg)
+                        for python_pkg in get_pkgs(MatchSpec(python_dep))
+                        if not py_spec or py_spec.match(python_pkg)]
+                n_candidates += n_numpy_pkgs * len(python_vns[python_dep])
+                for py_vn in python_vns[python_dep]:
+                    candidates.add((('python', py_vn),
+                                    ('numpy', np_vn),
+                                    ))
+            log.debug('{}: {} python/numpy candidates, {} after removing '
+                      'duplicates.'.format(meta.name(), n_candidates,
+                                           len(candidates)))
+            if solve_cache is not None:
+                solve_cache.n_candidates += n_candidates
+                solve_cache.n_unique_candidates += len(candidates)
+            for case in sorted(candidates):
+                add_case_if_soluble(case)
         elif 'python' in requirement_specs:
             if getattr(meta, 'noarch', None) == 'python':
                 # no python version dependency on noarch: python recipes
                 add_case_if_soluble(())
             else:
                 py_spec = requirement_specs.pop('python')
-                for python_pkg in get_pkgs(py_spec):
-                    py_vn = minor_vn(index[get_key(python_pkg)]['version'])
+                py_vns = set(minor_vn(python_pkg)
+                             for python_pkg in get_pkgs(py_spec))
+                for py_vn in sorted(py_vns):
                     case = (('python', py_vn), )
                     add_case_if_soluble(case)
 
@@ -229,7 +498,7 @@ def special_case_version_matrix(meta, index):
             pl_spec = requirement_specs.pop('perl')
             for case_base in list(cases or [()]):
                 for perl_pkg in get_pkgs(pl_spec):
-                    pl_vn = index[get_key(perl_pkg)]['version']
+                    pl_vn = index[perl_pkg]['version']
                     case = case_base + (('perl', pl_vn), )
                     add_case_if_soluble(case)
                 if case_base in cases:
@@ -239,7 +508,7 @@ def special_case_version_matrix(meta, index):
             r_spec = requirement_specs.pop('r-base')
             for case_base in list(cases or [()]):
                 for r_pkg in get_pkgs(r_spec):
-                    r_vn = index[get_key(r_pkg)]['version']
+                    r_vn = index[r_pkg]['version']
                     case = case_base + (('r-base', r_vn), )
                     add_case_if_soluble(case)
                 if case_base in cases:
@@ -258,6 +527,63 @@ def special_case_version_matrix(meta, index):
     return set(cases)
 
 
+class MatrixConditions(object):
+    """
+    A compiled set of conditions (conda specifications) on the special
+    versions of a build matrix, such as those given by ``--matrix-conditions``.
+
+    The specifications are parsed once, grouped by package name, and the
+    result of matching each (name, version) pair is cached, so a single
+    instance can be efficiently shared between all of the recipes being
+    built.
+
+    Parameters
+    ----------
+    specs : iterable of str
+        The conda specifications which each special version must satisfy.
+        Only the specifications of packages which appear in a case are
+        applied to it.
+
+    """
+    def __init__(self, specs=()):
+        self.specs = [spec.spec if isinstance(spec, MatchSpec) else spec
+                      for spec in specs]
+        self._specs_by_name = defaultdict(list)
+        for spec in self.specs:
+            match_spec = MatchSpec(spec)
+            self._specs_by_name[match_spec.name].append(match_spec)
+        # (name, version) -> whether the pair satisfies the conditions.
+        self._results = {}
+
+    def __repr__(self):
+        return 'MatrixConditions({!r})'.format(self.specs)
+
+    def __iter__(self):
+        return iter(self.specs)
+
+    def __len__(self):
+        return len(self.specs)
+
+    def match(self, name, version):
+        """Return whether the given special version satisfies the conditions."""
+        specs = self._specs_by_name.get(name)
+        if not specs:
+            return True
+        pair = (name, version)
+        result = self._results.get(pair)
+        if result is None:
+            # Invent a sensible "tar.bz2" name which we can use to invoke
+            # conda's MatchSpec matching.
+            pkg = ensure_dist_or_dict('{}-{}.0-0.tar.bz2'.format(name, version))
+            result = self._results[pair] = all(bool(spec.match(pkg))
+                                               for spec in specs)
+        return result
+
+    def __call__(self, case):
+        """Return whether all of the special versions of the case match."""
+        return all(self.match(name, version) for name, version in case)
+
+
 def filter_cases(cases, extra_specs):
     """
     cases might look like:
@@ -267,26 +593,174 @@ def filter_cases(cases, extra_specs):
                  [('python', '3.5'), ('numpy', '1.8')],
                  )
 
-    Typically extra_specs comes from the environment specification.
+    Typically extra_specs comes from the environment specification. It may
+    be a :class:`MatrixConditions` instance, to re-use the compiled
+    conditions (and their results) between calls.
 
     """
-    specs = [MatchSpec(spec) for spec in extra_specs]
+    if not isinstance(extra_specs, MatrixConditions):
+        extra_specs = MatrixConditions(extra_specs)
 
     for case in cases:
-        # Invent a sensible "tar.bz2" name which we can use to invoke conda's
-        # MatchSpec matching.
-        cases_by_pkg_name = {name: '{}-{}.0-0.tar.bz2'.format(name, version)
-                             for name, version in case}
-        match = []
-        for spec in specs:
-            # Only run the filter on the packages in cases.
-            if spec.name in cases_by_pkg_name:
-                match.append(bool(spec.match(ensure_dist_or_dict(cases_by_pkg_name[spec.name]))))
-        if all(match):
+        if extra_specs(case):
             yield case
 
 
-def keep_top_n_major_versions(cases, n=2):
+def parse_version(version):
+    """
+    Parse the leading (major, minor, patch) integers of a version string.
+
+    Components which are missing, or which don't start with a digit, are
+    given as -1. For example ``'1.8rc1'`` becomes ``(1, 8, -1)``.
+
+    """
+    parsed = []
+    for part in version.split('.', 3)[:3]:
+        digits = len(part) - len(part.lstrip('0123456789'))
+        parsed.append(int(part[:digits]) if digits else -1)
+    parsed.extend([-1] * (3 - len(parsed)))
+    return tuple(parsed)
+
+
+class VersionTable(object):
+    """
+    A table of the distinct versions of each package name, with their
+    parsed (major, minor, patch) columns.
+
+    Each (name, version) pair is parsed only once, no matter how many
+    index records or cases it appears in, so a table shared between calls
+    (see :meth:`for_index`) saves re-parsing the same versions when the
+    cases of each recipe are pruned.
+
+    """
+    def __init__(self, pairs=()):
+        # name -> [versions, majors, minors, patches, minor_vns]
+        self._columns = {}
+        # (name, version) -> row number within the name's columns.
+        self._rows = {}
+        self.extend(pairs)
+
+    @classmethod
+    def from_cases(cls, cases):
+        return cls(pair for case in cases for pair in case)
+
+    @classmethod
+    def from_index(cls, index):
+        return cls((info['name'], info['version']) for info in index.values())
+
+    @classmethod
+    def for_index(cls, index):
+        """
+        Return the (shared) table for the given index, creating it if
+        necessary. Rows for records added to the index later are parsed as
+        they are looked up.
+
+        """
+        # Mappings aren't hashable, so key on identity, and drop the entry
+        # once the index goes away.
+        key = id(index)
+        entry = _index_version_tables.get(key)
+        if entry is None or entry[0]() is not index:
+            try:
+                ref = weakref.ref(index, lambda ref: _index_version_tables.pop(key, None))
+            except TypeError:
+                # Not weak-referenceable (e.g. a plain dict).
+                return cls()
+            entry = _index_version_tables[key] = (ref, cls())
+        return entry[1]
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __repr__(self):
+        return '<VersionTable: {} names, {} versions>'.format(
+            len(self._columns), len(self._rows))
+
+    def add(self, name, version):
+        """Add the given version to the table, returning its row number."""
+        pair = (name, version)
+        row = self._rows.get(pair)
+        if row is None:
+            columns = self._columns.get(name)
+            if columns is None:
+                columns = self._columns[name] = [[], [], [], [], []]
+            row = self._rows[pair] = len(columns[0])
+            major, minor, patch = parse_version(version)
+            columns[0].append(version)
+            columns[1].append(major)
+            columns[2].append(minor)
+            columns[3].append(patch)
+            columns[4].append('.'.join(version.split('.')[:2]))
+        return row
+
+    def extend(self, pairs):
+        for name, version in pairs:
+            self.add(name, version)
+
+    def parsed(self, name, version):
+        """Return the (major, minor, patch) of the given version."""
+        row = self.add(name, version)
+        columns = self._columns[name]
+        return columns[1][row], columns[2][row], columns[3][row]
+
+    def minor_vn(self, name, version):
+        """Return the version truncated to its minor version, e.g. 1.8.2 -> 1.8."""
+        # The row must be added before the columns of the name are looked up.
+        row = self.add(name, version)
+        return self._columns[name][4][row]
+
+    def keep_top_n_major(self, n, pairs=None):
+        """
+        Return the set of (name, version) pairs (of those given, otherwise of
+        the whole table) which are within the top n major versions of their
+        name. If n is 0 all pairs are kept.
+
+        """
+        return self._keep_top_n(n, pairs, major_only=True)
+
+    def keep_top_n_minor(self, n, pairs=None):
+        """
+        Return the set of (name, version) pairs (of those given, otherwise of
+        the whole table) which are within the top n minor versions of their
+        name and major version. If n is 0 all pairs are kept.
+
+        """
+        return self._keep_top_n(n, pairs, major_only=False)
+
+    def _keep_top_n(self, n, pairs, major_only):
+        if pairs is None:
+            pairs = self._rows
+        pairs = set(pairs)
+        if not n:
+            return pairs
+        # (group, value) for each pair, where the top n values of each group
+        # are kept.
+        keys = {}
+        by_group = defaultdict(set)
+        for name, version in pairs:
+            major, minor, _ = self.parsed(name, version)
+            if major_only:
+                key = (name, ), major
+            else:
+                key = (name, major), minor
+            keys[(name, version)] = key
+            by_group[key[0]].add(key[1])
+        cutoff = {group: min(sorted(values)[-n:])
+                  for group, values in by_group.items()}
+        return set(pair for pair, (group, value) in keys.items()
+                   if value >= cutoff[group])
+
+
+# The shared VersionTable for each index, keyed on id(index). See
+# VersionTable.for_index.
+_index_version_tables = {}
+
+
+def _case_pairs(cases):
+    return set(pair for case in cases for pair in case)
+
+
+def keep_top_n_major_versions(cases, n=2, version_table=None):
     """
     Remove all but the top n major version cases for each package in cases.
 
@@ -297,23 +771,22 @@ def keep_top_n_major_versions(cases, n=2):
     n : integer >= 0
         The number of major versions to keep. Default is ``2``. 0 results in all
         major versions being kept.
+    version_table : VersionTable
+        The table in which to parse the versions (e.g. the shared table of
+        the index, from :meth:`VersionTable.for_index`). If not given, the
+        versions are parsed in a new table.
 
     """
-    name_to_major_versions = {}
-    for case in cases:
-        for name, version in case:
-            name_to_major_versions.setdefault(name, set()).add(int(version.split('.')[0]))
-    cutoff = {name: sorted(majors)[-n:] for name, majors in name_to_major_versions.items()}
+    cases = list(cases)
+    if version_table is None:
+        version_table = VersionTable()
+    kept = version_table.keep_top_n_major(n, _case_pairs(cases))
     for case in cases:
-        keeper = True
-        for name, version in case:
-            if int(version.split('.')[0]) not in cutoff[name]:
-                keeper = False
-        if keeper:
+        if all(pair in kept for pair in case):
             yield case
 
 
-def keep_top_n_minor_versions(cases, n=2):
+def keep_top_n_minor_versions(cases, n=2, version_table=None):
     """
     Remove all but the top n minor version cases for each package in cases.
     This will not do any major version filtering, so two major versions with
@@ -326,25 +799,71 @@ def keep_top_n_minor_versions(cases, n=2):
     n : integer >= 0
         The number of minor versions to keep. Default is ``2``. 0 results in all
         minor versions being kept.
+    version_table : VersionTable
+        The table in which to parse the versions. See
+        :func:`keep_top_n_major_versions`.
 
     """
-    mapping = {}
-    for case in cases:
-        for name, version in case:
-            major = int(version.split('.')[0])
-            minor = int(version.split('.')[1])
-            mapping.setdefault((name, major), set()).add(minor)
-    cutoff = {key: sorted(minors)[-n:] for key, minors in mapping.items()}
+    cases = list(cases)
+    if version_table is None:
+        version_table = VersionTable()
+    kept = version_table.keep_top_n_minor(n, _case_pairs(cases))
     for case in cases:
-        keeper = True
-        for name, version in case:
-            major = int(version.split('.')[0])
-            minor = int(version.split('.')[1])
-            if minor not in cutoff[(name, major)]:
-                keeper = False
-        if keeper:
+        if all(pair in kept for pair in case):
             yield case
 
+
+def prune_cases(cases, max_n_major_minor_versions=(2, 2), version_table=None):
+    """
+    Return the cases which are within the top n major versions, and then
+    within the top n minor versions (see :func:`keep_top_n_major_versions`
+    and :func:`keep_top_n_minor_versions`).
+
+    """
+    n_major, n_minor = max_n_major_minor_versions
+    if version_table is None:
+        version_table = VersionTable()
+    cases = list(keep_top_n_major_versions(cases, n_major, version_table))
+    return list(keep_top_n_minor_versions(cases, n_minor, version_table))
+
+
+def pruning_is_determined(candidates, max_n_major_minor_versions=(2, 2),
+                          version_table=None):
+    """
+    Return whether pruning (with :func:`prune_cases`) any subset of the
+    candidate cases which includes all of the pruned candidates gives the
+    pruned candidates.
+
+    This is the case when every version which sets a cutoff when pruning
+    the candidates is in the pruned candidates - the versions in such a
+    subset can be no higher, and the cutoffs are therefore unchanged. It
+    means that the pruned candidates can be known without knowing which of
+    the other candidates are solvable.
+
+    """
+    n_major, n_minor = max_n_major_minor_versions
+    if version_table is None:
+        version_table = VersionTable()
+    candidates = list(candidates)
+    pruned = prune_cases(candidates, max_n_major_minor_versions, version_table)
+
+    def majors(pairs):
+        return set((name, version_table.parsed(name, version)[0])
+                   for name, version in pairs)
+
+    def minors(pairs):
+        return set((name, ) + version_table.parsed(name, version)[:2]
+                   for name, version in pairs)
+
+    pruned_pairs = _case_pairs(pruned)
+    major_cutoffs = version_table.keep_top_n_major(n_major, _case_pairs(candidates))
+    if majors(major_cutoffs) != majors(pruned_pairs):
+        return False
+    candidates = list(keep_top_n_major_versions(candidates, n_major, version_table))
+    minor_cutoffs = version_table.keep_top_n_minor(n_minor, _case_pairs(candidates))
+    return minors(minor_cutoffs) == minors(pruned_pairs)
+
+
 if hasattr(conda_build, 'api'):
     def setup_vn_mtx_case(case, config):
         for pkg, version in case: